@@ -0,0 +1,41 @@
+from classes.Parsers import get_parser
+import glob
+import os
+import sys
+import time
+
+
+def parse(publisher, file_path, fast_parse):
+    start = time.perf_counter()
+    try:
+        parser = get_parser(publisher, file_path, fast_parse=fast_parse)
+        parser.parse()
+        result = (parser.doi, parser.authors, parser.paper)
+    except Exception as e:
+        result = ('error', type(e).__name__)
+    return result, time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    # Parses every saved preview page with and without fast_parse and lists the
+    # files where the results differ: python check_fast_parse.py [files_dir]
+    base_dir = sys.argv[1] if len(sys.argv) > 1 else 'files'
+
+    checked, mismatches = 0, []
+    times = {False: 0.0, True: 0.0}
+    for file_path in sorted(glob.glob(os.path.join(base_dir, '*', '*', 'previews', '*.html'))):
+        publisher = file_path.split(os.sep)[-4]
+        results = {}
+        for fast_parse in (False, True):
+            results[fast_parse], seconds = parse(publisher, file_path, fast_parse)
+            times[fast_parse] += seconds
+        checked += 1
+        if results[False] != results[True]:
+            mismatches.append(file_path)
+            print('mismatch', file_path)
+            print('  html.parser:', results[False])
+            print('  fast_parse: ', results[True])
+
+    print(f'{checked} files checked, {len(mismatches)} mismatches')
+    if checked:
+        print(f'html.parser {times[False]:.1f}s, fast_parse {times[True]:.1f}s')
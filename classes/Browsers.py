@@ -0,0 +1,162 @@
+import os
+import queue
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+
+import undetected_chromedriver as uc
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+
+from .Utils import get_user_agent
+
+
+def make_chrome_options(profile_path=None, download_dir=None, binary_location=None, extra_arguments=()):
+    options = uc.ChromeOptions()
+    options.headless = False  # Headless is detectable – start with visible mode
+    options.add_argument(f"user-agent={get_user_agent()}")
+    options.add_argument("--window-size=1280,800")
+    options.add_argument("lang=en-US,en;q=0.9")
+    for argument in extra_arguments:
+        options.add_argument(argument)
+    if profile_path:
+        options.add_argument(f"--user-data-dir={profile_path}")
+    if download_dir:
+        prefs = {
+            "download.default_directory": os.path.abspath(download_dir),
+            "plugins.always_open_pdf_externally": True,  # Disable Chrome PDF viewer, force download
+            "download.prompt_for_download": False,
+            "download.directory_upgrade": True,
+            "safebrowsing.enabled": True,
+        }
+        options.add_experimental_option("prefs", prefs)
+    if binary_location:
+        options.binary_location = binary_location
+    return options
+
+
+def set_download_dir(driver, path):
+    # long-lived browsers serve jobs for different journals, so the download
+    # directory is switched per job instead of being fixed at startup
+    driver.execute_cdp_cmd('Page.setDownloadBehavior', {
+        'behavior': 'allow',
+        'downloadPath': os.path.abspath(path)
+    })
+
+
+def wait_for(driver, selector, timeout=10):
+    # returns as soon as the css selector matches, or False after timeout seconds;
+    # callers parse whatever the page holds in either case
+    try:
+        WebDriverWait(driver, timeout).until(EC.presence_of_element_located((By.CSS_SELECTOR, selector)))
+        return True
+    except TimeoutException:
+        return False
+
+
+def is_alive(driver):
+    try:
+        driver.window_handles
+        return True
+    except Exception:
+        return False
+
+
+class BrowserPool:
+    # Keeps up to `size` Chrome instances alive and leases them to jobs.
+    # Browsers are started on demand, recycled after `max_pages` leases
+    # and replaced when they crash. With download_dir they save downloads
+    # there and pdfs are downloaded instead of opened in the viewer;
+    # set_download_dir switches the directory per job.
+    def __init__(self, size=2, max_pages=50, binary_location=None, extra_arguments=(), download_dir=None):
+        self.size = size
+        self.max_pages = max_pages
+        self.binary_location = binary_location
+        self.download_dir = download_dir
+        self.extra_arguments = extra_arguments
+        self.closed = False
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._pages = {}
+        self._profiles = {}
+        self._started = 0
+
+    def _start(self):
+        with self._lock:
+            self._started += 1
+            profile_path = os.path.join(tempfile.gettempdir(), f"selenium_profile_{os.getpid()}_{self._started}")
+        options = make_chrome_options(profile_path=profile_path,
+                                      download_dir=self.download_dir,
+                                      binary_location=self.binary_location,
+                                      extra_arguments=self.extra_arguments)
+        driver = uc.Chrome(options=options)
+        with self._lock:
+            self._pages[id(driver)] = 0
+            self._profiles[id(driver)] = profile_path
+        return driver
+
+    def _quit(self, driver):
+        try:
+            driver.quit()
+        except:
+            pass
+        with self._lock:
+            self._pages.pop(id(driver), None)
+            profile_path = self._profiles.pop(id(driver), None)
+        if profile_path:
+            shutil.rmtree(profile_path, ignore_errors=True)
+
+    def acquire(self):
+        self._slots.acquire()
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            return self._start()
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, driver, broken=False):
+        try:
+            with self._lock:
+                self._pages[id(driver)] = self._pages.get(id(driver), 0) + 1
+                pages = self._pages[id(driver)]
+            if broken or self.closed or pages >= self.max_pages:
+                self._quit(driver)
+            else:
+                self._idle.put(driver)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def lease(self):
+        driver = self.acquire()
+        broken = False
+        try:
+            yield driver
+        except Exception:
+            broken = not is_alive(driver)
+            raise
+        finally:
+            self.release(driver, broken=broken)
+
+    def close(self):
+        self.closed = True
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._quit(driver)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
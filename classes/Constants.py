@@ -10,6 +10,13 @@ SPLITTERS = {
     'replacements': ['-', '_', '']
 }
 
+# elements the parsers read from a rendered preview page, per host
+PREVIEW_READY_SELECTORS = {
+    'onlinelibrary.wiley.com': 'div.loa-authors, div.abstract-group',
+    'academic.oup.com': 'script[type="application/ld+json"]',
+    'pubsonline.informs.org': 'div.epub-section',
+}
+
 DEMO_SEARCH_INPUTS = {
     'elsevier': {
         'publisher': 'elsevier',
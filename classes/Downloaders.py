@@ -1,19 +1,84 @@
 import multiprocessing as mp
 import requests
+import asyncio
 import os
 import time
 import csv
-import shutil
-import tempfile
-import undetected_chromedriver as uc
-from selenium.webdriver.chrome.options import Options
-from .Utils import get_user_agent, make_download_target
-import random
-from concurrent.futures import ProcessPoolExecutor
+from .Utils import get_user_agent, make_download_target, write_atomic, stream_atomic
+from .Records import as_dict
+from .Sessions import get_session
+from .Browsers import BrowserPool, set_download_dir, wait_for
+from .Constants import PREVIEW_READY_SELECTORS
+from .RateLimiters import HostRateLimiter, is_challenge, parse_retry_after
+from collections import defaultdict
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+
+def write_results_log(results):
+    if not results:
+        return
+    time_string = time.strftime("%Y%m%d_%H%M", time.localtime()) + "_" + str(int(time.time()))
+    logdir = 'logs'
+    filename = f'downloads_{time_string}.csv'
+    os.makedirs(logdir,exist_ok=True)
+    # results differ in their keys (e.g. validators only come with fresh downloads)
+    fieldnames = list(dict.fromkeys(key for result in results for key in result))
+    with open(os.path.join(logdir, filename), 'w') as f:
+        writer = csv.DictWriter(f, fieldnames)
+        writer.writeheader()
+        writer.writerows(results)
+
+
+# the ArticleDownloader of a pool worker process, set once by _init_download_worker
+_worker_downloader = None
+
+
+def _init_download_worker(downloader):
+    # Runs once in every pool process. The downloader and its rate limiter are
+    # unpickled a single time, so the limiter keeps its state across the jobs
+    # of this process instead of starting with a full bucket for every job.
+    global _worker_downloader
+    _worker_downloader = downloader
+
+
+def _download_in_worker(job):
+    return _worker_downloader._download_worker(job)
+
+
+def _read_validator(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def iter_download_jobs(articles, fulltext=False, base_dir='files', manifest=None, refresh_older_than=None, limit=None):
+    # turns a stream of search results into download jobs without materializing it
+    jobs = (make_download_target(article, fulltext=fulltext, base_dir=base_dir) for article in articles)
+    if manifest is not None:
+        jobs = manifest.iter_pending(jobs, refresh_older_than=refresh_older_than)
+    return islice(jobs, limit)
+
 
 class WileyArticleDownloader:
-    def __init__(self, download_targets, open_access_only=False, limit=1400,
-                 delay=5, retries=2, processes=4 , output_results=False):
+    # Pages are rendered by a pool of `browsers` long-lived Chrome instances,
+    # each recycled after max_pages_per_browser pages. Pass browser_pool to share
+    # one pool between several downloaders. Browsers save files (pdfs too, instead
+    # of opening them in the viewer) below download_dir, in each job's directory.
+    def __init__(self, download_targets=(), open_access_only=False, limit=1400,
+                 delay=5, retries=2, processes=4 , output_results=False,
+                 browsers=2, max_pages_per_browser=50, browser_pool=None, rate_limiter=None,
+                 manifest=None, ready_timeout=15, download_dir='files'):
         self.download_targets = download_targets
         self.limit = limit
         self.delay = delay
@@ -21,16 +86,39 @@ class WileyArticleDownloader:
         self.max_retries = retries
         self.processes = processes
         self.output_results = output_results
+        self.browsers = browsers
+        self.max_pages_per_browser = max_pages_per_browser
+        self.browser_pool = browser_pool
+        self.rate_limiter = rate_limiter or HostRateLimiter.from_delay(delay)
+        self.manifest = manifest
+        self.ready_timeout = ready_timeout
+        self.download_dir = download_dir
         self.results = []
         self.queue = self._populate_download_queue()
 
     def _populate_download_queue(self):
-        return self.download_targets[:self.limit]
+        targets = self.download_targets
+        if self.manifest is not None:
+            targets = self.manifest.pending(targets)
+        return targets[:self.limit]
+
+    def _wait_until_ready(self, driver, url):
+        selector = PREVIEW_READY_SELECTORS.get(urlparse(url).netloc)
+        if selector:
+            wait_for(driver, selector, self.ready_timeout)
+        else:
+            time.sleep(self.delay)
+
+    def _recorded_worker(self, job):
+        job_result = self._download_worker(job)
+        if self.manifest is not None:
+            self.manifest.record(job_result)
+        return job_result
 
     def _download_worker(self, job):
         #time.sleep(random.uniform(1,5)) 
         #time.sleep(random.uniform(0.5, 2.5))
-        job_result = job.copy()
+        job_result = as_dict(job)
 
         path, _ = os.path.split(job['target'])
         os.makedirs(path, exist_ok=True)
@@ -41,60 +129,40 @@ class WileyArticleDownloader:
 
         print('downloading', job['url'], 'to', job['target'])
 
-        options = uc.ChromeOptions()
-        options.headless = False
-        options.add_argument(f"user-agent={get_user_agent()}")
-        options.add_argument("--window-size=1280,800")
-        options.add_argument("lang=en-US,en;q=0.9")
-        temp_dir = tempfile.gettempdir()
-        profile_path = os.path.join(temp_dir, f"selenium_profile_{os.getpid()}")
-        #profile_path = f"/tmp/selenium_profile_{os.getpid()}"
-        options.add_argument(f"--user-data-dir={profile_path}")
-        prefs = {
-            "download.default_directory": os.path.abspath(path),
-            "plugins.always_open_pdf_externally": True,  # Disable Chrome PDF viewer, force download
-            "download.prompt_for_download": False,
-            "download.directory_upgrade": True,
-            "safebrowsing.enabled": True,
-        }
-        options.add_experimental_option("prefs", prefs)
-
-        driver = None
-        try:
-            driver = uc.Chrome(options=options)
-
-            trial = 0
-            while trial < self.max_retries:
-                trial += 1
-                try:
+        trial = 0
+        while trial < self.max_retries:
+            trial += 1
+            self.rate_limiter.wait(job['url'])
+            try:
+                # a crashed browser is dropped from the pool by the lease,
+                # the next attempt then gets a fresh one
+                with self.browser_pool.lease() as driver:
+                    set_download_dir(driver, path)
                     driver.get(job['url'])
-                    time.sleep(self.delay)
+                    self._wait_until_ready(driver, job['url'])
                     driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-                    time.sleep(random.uniform(1.5, 4.0))
                     page_source = driver.page_source
-                    size = len(page_source.encode('utf-8')) / 1024 # in KB
-                    # Save fallback as HTML
-                    if size > 100:
-                        with open(job['target'], 'w', encoding='utf-8') as f:
-                            f.write(page_source)
-                        job_result.update({'downloaded': True, 'message': 'saved html', 'code': 200})
-                        break  # Exit retry loop on success
-                    else:
-                        time.sleep(self.delay)
-
-                except Exception as e:
-                    print(f"Download attempt {trial} failed for {job['url']}: {e}")
-                    time.sleep(self.delay)
+            except Exception as e:
+                print(f"Download attempt {trial} failed for {job['url']}: {e}")
+                self.rate_limiter.throttled(job['url'])
+                continue
 
-        except Exception as e:
-            print(f"Driver init failed: {e}")
-            job_result.update({'downloaded': False, 'message': 'driver init failed', 'code': None})
-        finally:
-            if driver:
+            size = len(page_source.encode('utf-8')) / 1024 # in KB
+            # pages below 100 KB are bot checks or error pages, not articles
+            challenge = size <= 100 or is_challenge(page_source)
+            self.rate_limiter.feedback(job['url'], 200, challenge=challenge)
+            # Save fallback as HTML
+            if not challenge:
+                # a disk or encoding error fails this job only, the manifest
+                # keeps it for the next run
                 try:
-                    driver.quit()
-                except:
-                    pass
+                    write_atomic(job['target'], page_source)
+                except (OSError, UnicodeError) as e:
+                    print(f"Saving {job['target']} failed: {e}")
+                    job_result.update({'downloaded': False, 'message': f'write failed: {e}', 'code': None})
+                    return job_result
+                job_result.update({'downloaded': True, 'message': 'saved html', 'code': 200})
+                break  # Exit retry loop on success
 
         if not job_result.get('downloaded', False):
             job_result.update({'downloaded': False, 'message': 'too many retries', 'code': None})
@@ -133,22 +201,38 @@ class WileyArticleDownloader:
         pool.close()
         pool.join()
         """
-        with ProcessPoolExecutor(max_workers=2) as executor:
-            self.results = list(executor.map(self._download_worker, self.queue))
+        self._run(self.queue)
+
+    def download_from(self, articles, fulltext=False, base_dir='files'):
+        # consumes search results while they arrive, e.g. from SearchProvider.iter_results()
+        self._run(iter_download_jobs(articles, fulltext=fulltext, base_dir=base_dir,
+                                     manifest=self.manifest, limit=self.limit))
+
+    def _run(self, jobs):
+        # browsers are separate processes already, threads only hand out the jobs
+        own_pool = self.browser_pool is None
+        if own_pool:
+            self.browser_pool = BrowserPool(size=self.browsers, max_pages=self.max_pages_per_browser,
+                                            download_dir=self.download_dir)
+        try:
+            with ThreadPoolExecutor(max_workers=self.browser_pool.size) as executor:
+                self.results = list(executor.map(self._recorded_worker, jobs))
+        finally:
+            if own_pool:
+                self.browser_pool.close()
+                self.browser_pool = None
 
         if self.output_results:
-            time_string = time.strftime("%Y%m%d_%H%M", time.localtime()) + "_" + str(int(time.time()))
-            logdir = 'logs'
-            filename = f'downloads_{time_string}.csv'
-            os.makedirs(logdir,exist_ok=True)
-            with open(os.path.join(logdir, filename), 'w') as f:
-                writer = csv.DictWriter(f, self.results[0].keys())
-                writer.writeheader()
-                writer.writerows(self.results)
+            write_results_log(self.results)
 
 class ArticleDownloader:
-    def __init__(self, download_targets, open_access_only=False, limit=1400,
-                 delay=1, retries=2, processes=4 , output_results=False):
+    # mode='pool' fans out over self.processes worker processes,
+    # mode='async' keeps up to max_concurrency requests in flight in a single process,
+    # with at most per_host_concurrency of them going to the same host.
+    def __init__(self, download_targets=(), open_access_only=False, limit=1400,
+                 delay=1, retries=2, processes=4 , output_results=False,
+                 mode='pool', max_concurrency=100, per_host_concurrency=8, rate_limiter=None,
+                 manifest=None, refresh_older_than=None, timeout=(10, 60), max_rate=10.0):
         self.download_targets = download_targets
         self.limit = limit
         self.delay = delay
@@ -156,61 +240,197 @@ class ArticleDownloader:
         self.max_retries = retries
         self.processes = processes
         self.output_results = output_results
+        self.mode = mode
+        self.max_concurrency = max_concurrency
+        self.per_host_concurrency = per_host_concurrency
+        # (connect, read) seconds, a stalled transfer fails and keeps its .part file
+        self.timeout = timeout
+        # in pool mode every worker process paces its own requests with its own
+        # copy of the limiter, like the fixed delay per process used to. Each host
+        # starts at 1 / delay requests per second and never goes above max_rate,
+        # which also caps async mode however many requests may be in flight
+        self.rate_limiter = rate_limiter or HostRateLimiter.from_delay(delay, max_rate=max_rate)
+        # with a manifest only pending or retryable jobs are queued and every
+        # result is recorded as soon as it arrives. Downloads older than
+        # refresh_older_than seconds are re-checked with a conditional request.
+        self.manifest = manifest
+        self.refresh_older_than = refresh_older_than
         self.results = []
         self.queue = self._populate_download_queue()
 
+    # pool workers get the downloader once for its settings and rate limiter,
+    # the job lists stay in the parent
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.update({'download_targets': (), 'queue': [], 'results': [], 'manifest': None})
+        return state
+
     def _populate_download_queue(self):
-        return self.download_targets[:self.limit]
+        targets = self.download_targets
+        if self.manifest is not None:
+            targets = self.manifest.pending(targets, refresh_older_than=self.refresh_older_than)
+        return targets[:self.limit]
+
+    def _record(self, job_result):
+        if self.manifest is not None:
+            self.manifest.record(job_result)
+        return job_result
 
     def _download_worker(self, job):
         #time.sleep(random.uniform(0.5, 2.5))
-        job_result = job.copy()
+        job_result = as_dict(job)
 
         path, _ = os.path.split(job['target'])
         os.makedirs(path, exist_ok=True)
-        if os.path.isfile(job['target']):
+        if os.path.isfile(job['target']) and not job.get('refresh'):
             job_result.update({'downloaded': False, 'message': 'file exists','code':''})
             print(job['target'], 'exists')
             return job_result
 
         print('downloading', job['url'], 'to', job['target'])
 
-        
+        # an interrupted pdf transfer leaves a .part file behind, which is resumed
+        # with a Range request. The ETag or Last-Modified of the first response is
+        # kept next to it and sent as If-Range, so a file that changed on the server
+        # is fetched in full instead of appended to. html targets are always
+        # fetched in full.
+        part = job['target'] + '.part'
+        validator_file = part + '.validator'
+        resumable = not job['target'].endswith('.html')
+
+        status_code = None
         trial = 0
         
         while trial < self.max_retries:
             trial += 1
 
-            download_result = requests.get(job['url'], headers=get_user_agent())
-            if download_result.status_code != requests.codes.ok:
-                time.sleep(self.delay)
-                continue
+            headers = get_user_agent()
+            offset, validator = 0, None
+            if resumable:
+                # range offsets count the bytes on the wire, so the body must not be compressed
+                headers['Accept-Encoding'] = 'identity'
+                validator = _read_validator(validator_file)
+                if validator and os.path.isfile(part):
+                    offset = os.path.getsize(part)
+            if offset:
+                headers['Range'] = f'bytes={offset}-'
+                headers['If-Range'] = validator
+            if job.get('refresh'):
+                if job.get('etag'):
+                    headers['If-None-Match'] = job['etag']
+                if job.get('last_modified'):
+                    headers['If-Modified-Since'] = job['last_modified']
 
-            if "text/html" in download_result.headers['content-type']:
-                with open(job['target'], 'w', encoding="utf-8") as f:
-                    f.write(download_result.text)
-            else:
-                with open(job['target'], 'wb') as f:
-                    f.write(download_result.content)
+            self.rate_limiter.wait(job['url'])
+            try:
+                # the body is only read once we know what to do with it,
+                # closing the response releases the connection either way
+                with get_session().get(job['url'], headers=headers, stream=True,
+                                       timeout=self.timeout) as download_result:
+                    status_code = download_result.status_code
+                    if status_code == requests.codes.not_modified:
+                        self.rate_limiter.success(job['url'])
+                        job_result.update({'downloaded': False, 'message': 'unchanged', 'code': status_code})
+                        return job_result
+                    if status_code == requests.codes.range_not_satisfiable:
+                        # the partial file does not match what the server has, start over
+                        _remove_file(part)
+                        _remove_file(validator_file)
+                        continue
 
-            job_result.update({'downloaded': True, 'message': '','code':download_result.status_code})
-            time.sleep(self.delay)
+                    # servers without range support answer 200 and the file is fetched in full
+                    resumed = (status_code == requests.codes.partial_content and
+                               download_result.headers.get('content-range', '').startswith(f'bytes {offset}-'))
+                    ok = status_code == requests.codes.ok or resumed
+
+                    is_html = "text/html" in download_result.headers.get('content-type', '')
+                    challenge = ok and is_html and is_challenge(download_result.text)
+                    self.rate_limiter.feedback(job['url'], status_code, challenge=challenge,
+                                               retry_after=parse_retry_after(download_result.headers.get('Retry-After')))
+                    if not ok or challenge:
+                        continue
+
+                    # previews are small and already decoded for the challenge check,
+                    # everything else (fulltext pdfs) is streamed to disk
+                    job_result.update({'etag': download_result.headers.get('ETag'),
+                                       'last_modified': download_result.headers.get('Last-Modified')})
+                    if is_html:
+                        write_atomic(job['target'], download_result.text)
+                    else:
+                        if resumed:
+                            print('..resuming', job['url'], 'at byte', offset)
+                        elif resumable:
+                            # a new transfer, remember what it has to match when it is resumed;
+                            # weak ETags are not allowed in If-Range
+                            etag = download_result.headers.get('ETag')
+                            validator = etag if etag and not etag.startswith('W/') else \
+                                download_result.headers.get('Last-Modified')
+                            if validator:
+                                write_atomic(validator_file, validator)
+                            else:
+                                _remove_file(validator_file)
+                        stream_atomic(download_result, job['target'], resume=resumed, keep_partial=resumable)
+                        _remove_file(validator_file)
+            except requests.exceptions.RequestException as e:
+                print(f"Download attempt {trial} failed for {job['url']}: {e}")
+                continue
+
+            job_result.update({'downloaded': True, 'message': '','code':status_code})
             return job_result
 
-        job_result.update({'downloaded': False, 'message': 'too many retries','code':download_result.status_code})
+        job_result.update({'downloaded': False, 'message': 'too many retries','code':status_code})
         return job_result
 
+    async def _download_async(self, jobs):
+        loop = asyncio.get_running_loop()
+        global_limit = asyncio.Semaphore(self.max_concurrency)
+        host_limits = defaultdict(lambda: asyncio.Semaphore(self.per_host_concurrency))
+
+        # requests is blocking, so every job runs on an executor thread while the
+        # semaphores decide how many of them are in flight. The host slot is taken
+        # first so that jobs queued for a busy host do not hold global slots.
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor, \
+                ThreadPoolExecutor(max_workers=1) as feeder:
+            async def run(job):
+                async with host_limits[urlparse(job['url']).netloc]:
+                    async with global_limit:
+                        try:
+                            job_result = await loop.run_in_executor(executor, self._download_worker, job)
+                        except Exception as e:
+                            print(f"Download failed for {job['url']}: {e}")
+                            job_result = as_dict(job)
+                            job_result.update({'downloaded': False, 'message': str(e), 'code': None})
+                        return self._record(job_result)
+
+            # jobs may come from a search that is still running, so the next one is
+            # pulled on a separate thread and scheduled as soon as it is there
+            jobs = iter(jobs)
+            tasks = []
+            while True:
+                job = await loop.run_in_executor(feeder, next, jobs, None)
+                if job is None:
+                    break
+                tasks.append(asyncio.ensure_future(run(job)))
+            return await asyncio.gather(*tasks)
+
     def download(self):
-        pool = mp.Pool(self.processes)
-        self.results = pool.map(self._download_worker, self.queue)
-        pool.close()
+        self._run(self.queue)
+
+    def download_from(self, articles, fulltext=False, base_dir='files'):
+        # consumes search results while they arrive, e.g. from SearchProvider.iter_results(),
+        # so downloads overlap with the remaining search pages
+        self._run(iter_download_jobs(articles, fulltext=fulltext, base_dir=base_dir, manifest=self.manifest,
+                                     refresh_older_than=self.refresh_older_than, limit=self.limit))
+
+    def _run(self, jobs):
+        if self.mode == 'async':
+            self.results = asyncio.run(self._download_async(jobs))
+        else:
+            pool = mp.Pool(self.processes, initializer=_init_download_worker, initargs=(self,))
+            # results are recorded here in the parent, workers never touch the manifest
+            self.results = [self._record(job_result) for job_result in pool.imap(_download_in_worker, jobs)]
+            pool.close()
+            pool.join()
 
         if self.output_results:
-            time_string = time.strftime("%Y%m%d_%H%M", time.localtime()) + "_" + str(int(time.time()))
-            logdir = 'logs'
-            filename = f'downloads_{time_string}.csv'
-            os.makedirs(logdir,exist_ok=True)
-            with open(os.path.join(logdir, filename), 'w') as f:
-                writer = csv.DictWriter(f, self.results[0].keys())
-                writer.writeheader()
-                writer.writerows(self.results)
+            write_results_log(self.results)
@@ -1,11 +1,41 @@
-import requests
-import time
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from .Sessions import get_session
+from .RateLimiters import HostRateLimiter, QuotaExhausted, RetriesExhausted, parse_retry_after, parse_quota
+
+# the Scopus fields fetch_metadata reads, requested alone in compact mode
+SCOPUS_FIELDS = ('dc:title', 'prism:doi', 'prism:coverDate', 'dc:creator', 'prism:volume', 'affiliation', 'citedby-count')
 
 class ElsevierMetadataScraper:
-    def __init__(self, api_key, year, journal, delay=3, max_results=1000):
+    def __init__(self, api_key, year, journal, delay=3, max_results=1000, rate_limiter=None, workers=8, max_rate=9.0,
+                 max_retries=5, max_quota_wait=3600, compact=False, page_size=None, archive=None,
+                 article_cache=None):
         self.api_key = api_key
-        self.delay = delay
+        self.delay = delay  # no longer used for pacing, see rate_limiter
+        # search and article requests share the api.elsevier.com bucket, which starts
+        # at the old pace of one request per second and never exceeds max_rate,
+        # set it to the requests per second the api key is allowed
+        self.rate_limiter = rate_limiter or HostRateLimiter(initial_rate=1.0, max_rate=max_rate)
+        # parallel article lookups
+        self.workers = workers
+        # a 429 is retried up to max_retries times, then RetriesExhausted is raised; if
+        # the quota only resets after more than max_quota_wait seconds QuotaExhausted
+        # is raised instead of waiting
+        self.max_retries = max_retries
+        self.max_quota_wait = max_quota_wait
+        # a RawResponseArchive keeps every raw response; without one only the last
+        # article and the first search page are dumped to json files. fetch_metadata
+        # closes it, pass a new one for every run
+        self.archive = archive
+        # an ArticleCache answers get_article for DOIs fetched in earlier runs
+        self.article_cache = article_cache
+        self._dump_lock = threading.Lock()
+        # compact requests only SCOPUS_FIELDS, 200 entries per page (the most the
+        # STANDARD view allows) and pages with a cursor, which is not limited to
+        # the first 5000 results like start offsets are
+        self.compact = compact
+        self.page_size = page_size or (200 if compact else 25)
         self.max_results = max_results
         self.endpoint = "https://api.elsevier.com/content/search/scopus"
         self.query = (
@@ -17,74 +47,138 @@ class ElsevierMetadataScraper:
             'X-ELS-APIKey': self.api_key,
             'Accept': 'application/json'
         }
+        self.session = get_session()
+    def _get(self, url, params=None):
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.wait(url)
+            response = self.session.get(url, headers=self.headers, params=params)
+            self.rate_limiter.feedback(url, response.status_code,
+                                       retry_after=parse_retry_after(response.headers.get('Retry-After')))
+            # a 429 without used up quota is a burst limit, feedback already slowed down
+            remaining, reset = parse_quota(response.headers)
+            pause = self.rate_limiter.quota(url, remaining, reset, max_pause=self.max_quota_wait)
+            if response.status_code != 429:
+                return response
+            if pause > self.max_quota_wait:
+                raise QuotaExhausted(url, reset)
+            if attempt < self.max_retries:
+                print(f"..rate limited, retrying {url} ({attempt + 1} of {self.max_retries})")
+        raise RetriesExhausted(url, self.max_retries)
+
     def get_article(self, doi):
+        if self.article_cache is not None and doi:
+            coredata = self.article_cache.get(doi)
+            if coredata is not None:
+                return coredata
 
         url = f'https://api.elsevier.com/content/article/doi/{doi}'
-        response = requests.get(url, headers=self.headers)
+        response = self._get(url)
         if response.status_code == 200:
             data = response.json()
-            with open('article_raw_response.json', 'w', encoding='utf-8') as f:
+            if self.archive is not None:
+                self.archive.add('article', doi, data)
+            else:
+                with self._dump_lock, open('article_raw_response.json', 'w', encoding='utf-8') as f:
                     json.dump(data, f, indent=2, ensure_ascii=False)
-            return data['full-text-retrieval-response']['coredata'] 
+            coredata = data['full-text-retrieval-response']['coredata']
+            if self.article_cache is not None and doi:
+                self.article_cache.put(doi, coredata)
+            return coredata
         return {}
 
-    def fetch_metadata(self):
+    def _make_result(self, entry, scidir):
+        affiliations = entry.get('affiliation', [])
+        affil_names = [a.get('affilname', '') for a in affiliations]
+        affil_str = '; '.join(affil_names) if affil_names else ''
+        return {
+            'title': entry.get('dc:title'),
+            'abstract': scidir.get('dc:description'),
+            #'abstract': self.get_abstract(scopus_id),
+            'doi': entry.get('prism:doi'),
+            'year': entry.get('prism:coverDate', '')[:4],
+            'cover_date': entry.get('prism:coverDate'),
+            'author.name': entry.get('dc:creator'),
+            'authors': scidir.get('authors'),
+            'volume': entry.get('prism:volume'),
+            'issue': scidir.get('prism:issueIdentifier'),
+            'affiliation': affil_str,
+            'citedbycount': entry.get("citedby-count"),
+            'page_range': scidir.get("prism:pageRange"),
+            'start_page': scidir.get('prism:startingPage'),
+            'end_page': scidir.get('prism:endingPage')
+        }
+
+    def _collect(self, lookups):
+        # waits for the article lookups of one page, in entry order
+        return [self._make_result(entry, future.result()) for entry, future in lookups]
+
+    def fetch_metadata(self, start=0, cursor='*'):
+        # start (or cursor in compact mode) resumes a run that raised QuotaExhausted,
+        # the exception carries them along with the results collected so far
         all_results = []
-        start = 0
-        count = 25  # max per request
+        count = self.page_size
+        # article lookups of the previous page, they run while the next page is requested
+        lookups = []
+        # first page whose results are not in all_results yet
+        resume_start, resume_cursor = start, cursor
 
-        while start < self.max_results:
-            params = {
-                'query': self.query,
-                'count': count,
-                'start': start
-            }
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        try:
+            while start < self.max_results:
+                params = {
+                    'query': self.query,
+                    'count': count,
+                }
+                if self.compact:
+                    params.update({'field': ','.join(SCOPUS_FIELDS), 'cursor': cursor})
+                else:
+                    params['start'] = start
 
-            print(f"Requesting results {start + 1} to {start + count}...")
+                print(f"Requesting results {start + 1} to {start + count}...")
 
-            response = requests.get(self.endpoint, headers=self.headers, params=params)
+                response = self._get(self.endpoint, params=params)
 
-            if response.status_code != 200:
-                print(f"Request failed with status {response.status_code}")
-                break
+                if response.status_code != 200:
+                    print(f"Request failed with status {response.status_code}")
+                    break
 
-            data = response.json()
-            if start == 0:
-                with open('elsevier_raw_response.json', 'w', encoding='utf-8') as f:
-                    json.dump(data, f, indent=2, ensure_ascii=False)
-            entries = data.get('search-results', {}).get('entry', [])
-
-            if not entries:
-                print("No more entries found.")
-                break
-
-            for entry in entries:
-                affiliations = entry.get('affiliation', [])
-                affil_names = [a.get('affilname', '') for a in affiliations]
-                affil_str = '; '.join(affil_names) if affil_names else ''
-                doi = entry.get('prism:doi')
-                scidir = self.get_article(doi)
-
-                all_results.append({
-                    'title': entry.get('dc:title'),
-                    'abstract': scidir.get('dc:description'),
-                    #'abstract': self.get_abstract(scopus_id),
-                    'doi': doi,
-                    'year': entry.get('prism:coverDate', '')[:4],
-                    'cover_date': entry.get('prism:coverDate'),
-                    'author.name': entry.get('dc:creator'),
-                    'authors': scidir.get('authors'),
-                    'volume': entry.get('prism:volume'),
-                    'issue': scidir.get('prism:issueIdentifier'),
-                    'affiliation': affil_str,
-                    'citedbycount': entry.get("citedby-count"),
-                    'page_range': scidir.get("prism:pageRange"),
-                    'start_page': scidir.get('prism:startingPage'),
-                    'end_page': scidir.get('prism:endingPage')
-                })
-                time.sleep(1)
-            start += count
-            time.sleep(self.delay)
+                data = response.json()
+                if self.archive is not None:
+                    self.archive.add('search', f"{self.query} [{start}]", data)
+                elif start == 0:
+                    with open('elsevier_raw_response.json', 'w', encoding='utf-8') as f:
+                        json.dump(data, f, indent=2, ensure_ascii=False)
+                entries = data.get('search-results', {}).get('entry', [])
+
+                if not entries:
+                    print("No more entries found.")
+                    break
+
+                page_lookups = [(entry, executor.submit(self.get_article, entry.get('prism:doi'))) for entry in entries]
+                all_results.extend(self._collect(lookups))
+                resume_start, resume_cursor = start, cursor
+                lookups = page_lookups
+                start += count
+
+                if self.compact:
+                    search_results = data['search-results']
+                    cursor = search_results.get('cursor', {}).get('@next')
+                    if not cursor or start >= int(search_results.get('opensearch:totalResults', 0)):
+                        break
+
+            all_results.extend(self._collect(lookups))
+        except QuotaExhausted as e:
+            e.start, e.cursor, e.results = resume_start, resume_cursor, all_results
+            print(f"Stopped: {e}, resume with fetch_metadata(start={resume_start}, cursor={resume_cursor!r})")
+            raise
+        finally:
+            # lookups still queued when the quota runs out are dropped
+            executor.shutdown(cancel_futures=True)
+            # the records of this run are on disk once fetch_metadata returns
+            if self.archive is not None:
+                self.archive.close()
 
         print(f"Retrieved {len(all_results)} results.")
+        if self.article_cache is not None:
+            self.article_cache.report()
         return all_results
@@ -0,0 +1,50 @@
+import threading
+from collections import Counter
+
+from .Utils import normalize_doi
+
+
+class DOIIndex:
+    # Articles seen in a run, keyed by normalized DOI (the preview url for articles
+    # without one). Share one index between providers to drop duplicates across
+    # queries and journals; fields a duplicate has and the kept article lacks are
+    # merged into the kept one.
+    def __init__(self):
+        self._articles = {}
+        self._lock = threading.Lock()
+        self.duplicates = Counter()
+
+    @staticmethod
+    def _key(article):
+        doi = normalize_doi(article.get('doi'))
+        return doi if doi else ('url', article.get('preview_url'))
+
+    def add(self, article):
+        # True for an article not seen before
+        key = self._key(article)
+        with self._lock:
+            kept = self._articles.get(key)
+            if kept is None:
+                self._articles[key] = article
+                return True
+            for field, value in article.items():
+                if kept.get(field) in (None, '') and value not in (None, ''):
+                    kept[field] = value
+            self.duplicates[article.get('journal_shortname')] += 1
+            return False
+
+    def get(self, doi):
+        return self._articles.get(normalize_doi(doi))
+
+    def __contains__(self, doi):
+        return normalize_doi(doi) in self._articles
+
+    def __len__(self):
+        return len(self._articles)
+
+    def report(self):
+        total = sum(self.duplicates.values())
+        if total:
+            per_journal = ', '.join(f'{journal}: {n}' for journal, n in self.duplicates.most_common())
+            print(f'..dropped {total} duplicate articles ({per_journal})')
+        return total
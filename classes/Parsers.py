@@ -1,6 +1,5 @@
-from bs4 import BeautifulSoup
 
-from .Utils import match_emails
+from .Utils import match_emails, make_soup
 from datetime import datetime
 import json
 import textract
@@ -8,7 +7,7 @@ import re
 import os
 
 
-def get_parser(publisher, filepath):
+def get_parser(publisher, filepath, fast_parse=False):
     parser_map = {
         'elsevier': ElsevierParser,
         'springer': SpringerParser,
@@ -19,18 +18,26 @@ def get_parser(publisher, filepath):
         'cambridge': CambridgeParser,
         'INFORMS': INFORMSParser
     }
-    Parser = parser_map.get(publisher, lambda fp: "Parser does not exist exists")
-    return Parser(filepath)
+    Parser = parser_map.get(publisher, lambda fp, fast_parse=False: "Parser does not exist exists")
+    return Parser(filepath, fast_parse=fast_parse)
 
 
 class FileParser:
-    def __init__(self, fp):
+    # (tag name, attrs) of the elements a parser reads besides the meta tags; with
+    # fast_parse only <head>, the meta tags and these are built, using lxml
+    parse_targets = ()
+
+    def __init__(self, fp, fast_parse=False):
         self.file_path = fp
+        self.fast_parse = fast_parse
         self.authors = []
         self.paper = []
         self.doi = None
         self.parsed = False
         self.file_content = self._read_contents()
+        # meta tag name/property -> contents in document order, see _index_meta
+        self.meta = {}
+        self.meta_pairs = []
 
     @property
     def institutions(self):
@@ -40,14 +47,48 @@ class FileParser:
         with open(self.file_path, 'r', encoding=file_encoding) as f:
             return f.read()
 
+    def _make_soup(self):
+        targets = (('head', {}), ('meta', {})) + tuple(self.parse_targets)
+        soup = make_soup(self.file_content, targets, fast=self.fast_parse)
+        self._index_meta(soup)
+        return soup
+
+    def _index_meta(self, soup):
+        # one pass over all meta tags; parsers look fields up here instead of
+        # scanning the tree again. meta_pairs keeps the document order for fields
+        # that repeat per author.
+        self.meta = {}
+        self.meta_pairs = []
+        for element in soup.find_all('meta'):
+            content = element.get('content')
+            if content is None:
+                continue
+            for key in (element.get('name'), element.get('property')):
+                if key:
+                    self.meta.setdefault(key, []).append(content)
+                    self.meta_pairs.append((key, content))
+
+    def meta_first(self, key, default=None):
+        values = self.meta.get(key)
+        return values[0] if values else default
+
+    def meta_last(self, key, default=None):
+        values = self.meta.get(key)
+        return values[-1] if values else default
+
+    def meta_sequence(self, keys):
+        return [(key, content) for key, content in self.meta_pairs if key in keys]
+
     def parse(self):
         raise NotImplemented('You need to sub-class FileParser and implement the parse method.')
 
 
 class ElsevierParser(FileParser):
+    parse_targets = (('script', {'type': 'application/json', 'data-iso-key': '_0'}),)
+
     def parse(self):
-        soup = BeautifulSoup(self.file_content, 'html.parser')
-        self.doi = soup.find('meta', attrs={'name': 'dc.identifier'})['content']
+        soup = self._make_soup()
+        self.doi = self.meta_first('dc.identifier')
 
         res = soup.find('script', attrs={'type': 'application/json', 'data-iso-key': '_0'})
         if not res:
@@ -212,49 +253,19 @@ class ElsevierParser(FileParser):
         else:
             abstract = ''
 
-        meta_elements = soup.find_all('meta')
-        relevant_paper = ['citation_title', 'citation_issue', 'citation_volume', 'citation_firstpage', 'citation_lastpage', 'citation_publication_date']
-        filtered_elements_paper = [m for m in meta_elements if m.get('name', '') in relevant_paper]
-
-        currentpaper = None
+        # each field comes from its own tag; before the meta index, fields whose tags
+        # preceded citation_volume were lost and came out as []
         currentpaper = {
-            'title':  [],
-            'abstract': [],
-            'volume': [],
-            'issue': [],
-            'start': [],
-            'end': [],
-            'date': [],
-            'author': [],
-            'year': []
+            'title': self.meta_last('citation_title', []),
+            'abstract': abstract,
+            'volume': self.meta_last('citation_volume', []),
+            'issue': self.meta_last('citation_issue', []),
+            'start': self.meta_last('citation_firstpage', []),
+            'end': self.meta_last('citation_lastpage', []),
+            'date': self.meta_last('citation_publication_date', []),
+            'author': self.authors[0] if 'citation_volume' in self.meta else [],
+            'year': self.meta_last('citation_publication_date', [])
         }
-        for e in filtered_elements_paper:
-            if e['name'] == 'citation_volume':
-                if currentpaper:
-                    self.paper.append(currentpaper)
-                currentpaper = {
-                    'title':  [],
-                    'abstract': [],
-                    'volume': e['content'],
-                    'issue': [],
-                    'start': [],
-                    'end': [],
-                    'date': [],
-                    'author': self.authors[0],
-                    'year': []
-                }
-            if e['name'] == 'citation_title':
-                currentpaper['title'] = e['content']
-            if e['name'] == 'citation_issue':
-                currentpaper['issue'] = e['content']
-            if e['name'] == 'citation_firstpage':
-                currentpaper['start'] = e['content']
-            if e['name'] == 'citation_lastpage':
-                currentpaper['end'] = e['content']
-            if e['name'] == 'citation_publication_date':
-                currentpaper['date'] = e['content']
-                currentpaper['year'] = e['content']
-            currentpaper['abstract'] = abstract
         #        print(type(currentpaper))
         self.paper = currentpaper
 
@@ -265,74 +276,53 @@ class ElsevierParser(FileParser):
 
 
 class SpringerParser(FileParser):
+    parse_targets = (('li', {'class': 'c-bibliographic-information__list-item--doi'}),)
+
     def parse(self):
-        soup = BeautifulSoup(self.file_content, 'html.parser')
+        soup = self._make_soup()
 
-        content_type_element = soup.find('meta', attrs={'name': 'dc.type'})
-        if content_type_element:
-            content_type = content_type_element['content']
+        content_type = self.meta_first('dc.type')
+        if content_type:
             if any([s.lower() in content_type.lower() for s in ['Announcement']]):
                 return self
 
-        doi_element = soup.find('meta', attrs={'name': 'DOI'})
-        if doi_element:
-            self.doi = doi_element['content']
-        else:
+        self.doi = self.meta_first('DOI')
+        if not self.doi:
             bib_doi = soup.find('li', attrs={'class': 'c-bibliographic-information__list-item--doi'})
             if bib_doi:
                 doi_span = bib_doi.find('span', attrs={'class': 'c-bibliographic-information__value'})
                 if doi_span:
                     self.doi = doi_span.a['href'].replace('https://doi.org/', '')
 
-        meta_elements = soup.find_all('meta')
-        relevant = ['citation_author', 'citation_author_email', 'citation_author_institution']
-        filtered_elements = [m for m in meta_elements if m.get('name', '') in relevant]
-
-        relevant_paper = ['dc.title', 'dc.description', 'prism.volume', 'prism.number', 'prism.startingPage', 'prism.endingPage', 'prism.publicationDate']
-        filtered_elements_paper = [m for m in meta_elements if m.get('name', '') in relevant_paper]
+        relevant = ('citation_author', 'citation_author_email', 'citation_author_institution')
 
         current = None
-        for e in filtered_elements:
-            if e['name'] == 'citation_author':
+        for name, content in self.meta_sequence(relevant):
+            if name == 'citation_author':
                 if current:
                     self.authors.append(current)
                 current = {
-                    'name': e['content'],
+                    'name': content,
                     'emails': [],
                     'affiliations': []
                 }
-            if e['name'] == 'citation_author_email':
-                current['emails'].append(e['content'])
-            if e['name'] == 'citation_author_institution':
-                current['affiliations'].append(e['content'])
+            if name == 'citation_author_email':
+                current['emails'].append(content)
+            if name == 'citation_author_institution':
+                current['affiliations'].append(content)
         self.authors.append(current)
 
         currentpaper = None
-        for e in filtered_elements_paper:
-            if e['name'] == 'dc.title':
-                if currentpaper:
-                    self.paper.append(currentpaper)
-                currentpaper = {
-                    'title': e['content'],
-                    'abstract': None,
-                    'volume': None,
-                    'issue': None,
-                    'start': None,
-                    'end': None,
-                    'date': None
-                }
-            if e['name'] == 'dc.description':
-                currentpaper['abstract'] = e['content']
-            if e['name'] == 'prism.volume':
-                currentpaper['volume'] = e['content']
-            if e['name'] == 'prism.number':
-                currentpaper['issue'] = e['content']
-            if e['name'] == 'prism.startingPage':
-                currentpaper['start'] = e['content']
-            if e['name'] == 'prism.endingPage':
-                currentpaper['end'] = e['content']
-            if e['name'] == 'prism.publicationDate':
-                currentpaper['date'] = e['content']
+        if 'dc.title' in self.meta:
+            currentpaper = {
+                'title': self.meta_last('dc.title'),
+                'abstract': self.meta_last('dc.description'),
+                'volume': self.meta_last('prism.volume'),
+                'issue': self.meta_last('prism.number'),
+                'start': self.meta_last('prism.startingPage'),
+                'end': self.meta_last('prism.endingPage'),
+                'date': self.meta_last('prism.publicationDate')
+            }
 #        print(type(currentpaper))
         self.paper = currentpaper
 
@@ -341,12 +331,15 @@ class SpringerParser(FileParser):
 
 
 class WileyParser(FileParser):
+    parse_targets = (('div', {'class': 'loa-authors'}), ('div', {'class': 'abstract-group'}),
+                     ('div', {'class': 'article-section__content'}))
+
     def parse(self):
-        soup = BeautifulSoup(self.file_content, 'html.parser')
+        soup = self._make_soup()
         if any([t in self.file_content for t in ['ERRATUM', 'RETRACTION', 'CORRIGENDUM', 'Errata', 'FELLOW OF THE YEAR', 'AWARDS AND PRIZES', 'EDITORIAL']]):
             return self
 
-        title_content = soup.find('meta', attrs={'property': 'og:title'})['content']
+        title_content = self.meta_first('og:title')
         if any([st.lower() in title_content.lower() for st in [
             'Cover Image', 'Issue Information', 'CORRIGENDUM', "Report of the", "BRATTLE GROUP PRIZES",
             'AMERICAN FINANCE ASSOCIATION', 'Participant Schedule', 'DIMENSIONAL FUND ADVISORS PRIZES',
@@ -360,7 +353,7 @@ class WileyParser(FileParser):
         if any([title_content == 'ANNOUNCEMENTS', title_content == 'MISCELLANEA']):
             return self
 
-        self.doi = soup.find('meta', attrs={'name': 'dc.identifier'})['content']
+        self.doi = self.meta_first('dc.identifier')
 
         if soup.find('div', attrs={'class': 'loa-authors'}) is not None:
             if len(soup.find('div', attrs={'class': 'loa-authors'}).find_all('div', attrs={'class': 'accordion-tabbed__tab-mobile'})) != 0:
@@ -406,41 +399,22 @@ class WileyParser(FileParser):
             else:
                 abstract = None
 
-        meta_elements = soup.find_all('meta')
         relevant_paper = ['citation_title', 'citation_volume', 'citation_issue', 'citation_firstpage', 'citation_lastpage', 'citation_publication_date']
-        filtered_elements_paper = [m for m in meta_elements if m.get('name', '') in relevant_paper]
 
-        currentpaper = None
         currentpaper = {
-            'title':  [],
+            'title': self.meta_last('citation_title', []),
             'abstract': abstract,
             'doi': self.doi,
-            'volume': [],
-            'issue': [],
-            'start': [],
-            'end': [],
-            'date': [],
+            'volume': self.meta_last('citation_volume', []),
+            'issue': self.meta_last('citation_issue', []),
+            'start': self.meta_last('citation_firstpage', []),
+            'end': self.meta_last('citation_lastpage', []),
+            'date': self.meta_last('citation_publication_date', []),
             'author': [],
-            'year': []
+            'year': self.meta_last('citation_publication_date', [])
         }
-        for e in filtered_elements_paper:
-            if e['name'] == 'citation_title':
-                currentpaper['title'] = e['content']
-            if e['name'] == 'Description':
-                currentpaper['abstract'] = e['content']
-            if e['name'] == 'citation_volume':
-                currentpaper['volume'] = e['content']
-            if e['name'] == 'citation_issue':
-                currentpaper['issue'] = e['content']
-            if e['name'] == 'citation_firstpage':
-                currentpaper['start'] = e['content']
-            if e['name'] == 'citation_lastpage':
-                currentpaper['end'] = e['content']
-            if e['name'] == 'citation_publication_date':
-                currentpaper['date'] = e['content']
-                currentpaper['year'] = e['content']
-            if 0 < len(self.authors):
-                currentpaper['author'] = self.authors[0]
+        if 0 < len(self.authors) and any(name in self.meta for name in relevant_paper):
+            currentpaper['author'] = self.authors[0]
         #        print(type(currentpaper))
         self.paper = currentpaper
 
@@ -449,8 +423,10 @@ class WileyParser(FileParser):
 
 
 class TAndFParser(FileParser):
+    parse_targets = (('span', {'class': 'contribDegrees'}),)
+
     def parse(self):
-        soup = BeautifulSoup(self.file_content, 'html.parser')
+        soup = self._make_soup()
         self.doi = soup.find('meta', attrs={'name': 'dc.Identifier', 'scheme': 'doi'})["content"]
 
         author_spans = soup.find_all('span', attrs={'class': 'contribDegrees'})
@@ -476,26 +452,24 @@ class TAndFParser(FileParser):
 
 class NatureParser(FileParser):
     def parse(self):
-        soup = BeautifulSoup(self.file_content, 'html.parser')
-        self.doi = soup.find('meta', attrs={'name': 'DOI'})['content']
+        soup = self._make_soup()
+        self.doi = self.meta_first('DOI')
 
-        meta_elements = soup.find_all('meta')
-        relevant = ['citation_author', 'citation_author_institution']
-        filtered_elements = [m for m in meta_elements if m.get('name', '') in relevant]
+        relevant = ('citation_author', 'citation_author_institution')
 
         authors = []
         current = None
-        for e in filtered_elements:
-            if e['name'] == 'citation_author':
+        for name, content in self.meta_sequence(relevant):
+            if name == 'citation_author':
                 if current:
                     authors.append(current)
                 current = {
-                    'name': e['content'],
+                    'name': content,
                     'emails': [],
                     'affiliations': []
                 }
-            if e['name'] == 'citation_author_institution':
-                current['affiliations'].append(e['content'])
+            if name == 'citation_author_institution':
+                current['affiliations'].append(content)
         authors.append(current)
 
         # here, we need to find e-mail addresses from full-texts and match them accordingly
@@ -518,8 +492,11 @@ class NatureParser(FileParser):
 
 
 class OxfordParser(FileParser):
+    parse_targets = (('script', {'type': 'application/ld+json'}), ('title', {}),
+                     ('div', {'class': 'info-author-correspondence'}), ('section', {'class': 'abstract'}))
+
     def parse(self):
-        soup = BeautifulSoup(self.file_content, 'html.parser')
+        soup = self._make_soup()
         json_element = soup.find('script', attrs={'type': 'application/ld+json'})
         if not json_element:
             print("no data in", self.file_path)
@@ -568,42 +545,37 @@ class OxfordParser(FileParser):
 #        meta_citation_volume = soup.find('meta', {'name': 'citation_volume'})
 #        meta_citation_issue = soup.find('meta', {'name': 'citation_volume'})
 
-        meta_elements = soup.find_all('meta')
-        relevant_paper = ['citation_issue', 'citation_volume', 'citation_publication_date']
-        filtered_elements_paper = [m for m in meta_elements if m.get('name', '') in relevant_paper]
-
+        # issue and year are read from their own tags, so their order next to
+        # citation_volume does not matter; before the meta index a citation_issue or
+        # citation_publication_date tag ahead of citation_volume raised a TypeError
         currentpaper = None
-        for e in filtered_elements_paper:
-            if e['name'] == 'citation_volume':
-                if currentpaper:
-                    self.paper.append(currentpaper)
-                if 0 < len(authors):
-                    currentpaper = {
-                        'title':  json_data['name'],
-                        'abstract': abstract,
-                        'doi': self.doi,
-                        'volume': e['content'],
-                        'issue': [],
-                        'start': json_data['pageStart'],
-                        'end': json_data['pageEnd'],
-                        'date': json_data['datePublished'],
-                        'author': authors[0],
-                    }
-                else:
-                    currentpaper = {
-                        'title':  json_data['name'],
-                        'abstract': abstract,
-                        'volume': e['content'],
-                        'issue': [],
-                        'start': json_data['pageStart'],
-                        'end': json_data['pageEnd'],
-                        'date': json_data['datePublished'],
-                        'author': authors,
-                    }
-            if e['name'] == 'citation_issue':
-                currentpaper['issue'] = e['content']
-            if e['name'] == 'citation_publication_date':
-                currentpaper['year'] = e['content']
+        volume = self.meta_last('citation_volume')
+        if volume is not None:
+            if 0 < len(authors):
+                currentpaper = {
+                    'title':  json_data['name'],
+                    'abstract': abstract,
+                    'doi': self.doi,
+                    'volume': volume,
+                    'issue': self.meta_last('citation_issue', []),
+                    'start': json_data['pageStart'],
+                    'end': json_data['pageEnd'],
+                    'date': json_data['datePublished'],
+                    'author': authors[0],
+                }
+            else:
+                currentpaper = {
+                    'title':  json_data['name'],
+                    'abstract': abstract,
+                    'volume': volume,
+                    'issue': self.meta_last('citation_issue', []),
+                    'start': json_data['pageStart'],
+                    'end': json_data['pageEnd'],
+                    'date': json_data['datePublished'],
+                    'author': authors,
+                }
+            if 'citation_publication_date' in self.meta:
+                currentpaper['year'] = self.meta_last('citation_publication_date')
         #        print(type(currentpaper))
         self.paper = currentpaper
 
@@ -624,10 +596,12 @@ class OxfordParser(FileParser):
 
 
 class CambridgeParser(FileParser):
+    parse_targets = (('div', {'class': 'contributors-details'}), ('div', {'class': 'row published-date'}))
+
     def parse(self):
-        soup = BeautifulSoup(self.file_content, 'html.parser')
+        soup = self._make_soup()
 
-        title = soup.find('meta', attrs={'property': 'og:title'})['content']
+        title = self.meta_first('og:title')
         #print(title)
         if any([st.lower() in title.lower() for st in ['ERRATUM', 'CORRIGENDUM']]):
             return self
@@ -693,51 +667,24 @@ class CambridgeParser(FileParser):
         else:
             authors = [{'name': ''}]
         
-        self.doi = soup.find('meta', attrs={'name': 'citation_doi'})['content']
+        self.doi = self.meta_first('citation_doi')
         self.authors = authors
 
-        meta_elements = soup.find_all('meta')
-        """
-        if self.doi == "10.1017/S0022109024000371":
-            with open('testmeta.json', 'w', encoding='utf-8') as f:
-                cleaned = [str(tag) for tag in meta_elements] 
-                json.dump(cleaned, f, indent=4)
-        """
-        relevant_paper = ['citation_title', 'citation_issue', 'citation_volume', 'citation_firstpage', 'citation_lastpage', 'citation_publication_date', 'citation_abstract']
-        filtered_elements_paper = [m for m in meta_elements if m.get('name', '') in relevant_paper]
-
         date = soup.find('div',attrs={'class':'row published-date'}).find('strong').text.strip()
         date = datetime.strptime(date, "%d %B %Y")
         date = date.strftime("%Y/%m/%d")
-        currentpaper = None
         currentpaper = {
-            'title':  [],
-            'abstract': [],
+            'title': self.meta_last('citation_title', []),
+            'abstract': self.meta_last('citation_abstract', []),
             'doi': self.doi,
-            'volume': [],
-            'issue': [],
-            'start': [],
-            'end': [],
-            'date': date,
+            'volume': self.meta_last('citation_volume', []),
+            'issue': self.meta_last('citation_issue', []),
+            'start': self.meta_last('citation_firstpage', []),
+            'end': self.meta_last('citation_lastpage', []),
+            'date': self.meta_last('citation_publication_date', date),
             'author': self.authors[0],
-            'year': date[:4]
+            'year': self.meta_last('citation_publication_date', date[:4])
         }
-        for e in filtered_elements_paper:
-            if e['name'] == 'citation_title':
-                currentpaper['title'] = e['content']
-            if e['name'] == 'citation_volume':
-                currentpaper['volume'] = e['content']
-            if e['name'] == 'citation_issue':
-                currentpaper['issue'] = e['content']
-            if e['name'] == 'citation_firstpage':
-                currentpaper['start'] = e['content']
-            if e['name'] == 'citation_lastpage':
-                currentpaper['end'] = e['content']
-            if e['name'] == 'citation_publication_date':
-                currentpaper['date'] = e['content']
-                currentpaper['year'] = e['content']
-            if e['name'] == 'citation_abstract':
-                currentpaper['abstract'] = e['content']
         #        print(type(currentpaper))
         self.paper = currentpaper
 
@@ -746,8 +693,11 @@ class CambridgeParser(FileParser):
 
 
 class INFORMSParser(FileParser):
+    parse_targets = (('div', {'class': 'citation'}), ('div', {'class': 'epub-section'}),
+                     ('div', {'class': 'abstractSection abstractInFull'}))
+
     def parse(self):
-        soup = BeautifulSoup(self.file_content, 'html.parser')
+        soup = self._make_soup()
         citation_element = soup.find('div',attrs={'class':'citation'})
         title = citation_element.find('h1',attrs={'class':'citation__title'}).text
         authors_element = citation_element.find('ul',attrs={'title':'list of authors'})
@@ -772,39 +722,19 @@ class INFORMSParser(FileParser):
         self.doi = publish_element.find('a',attrs={'class':'epub-section__doi__text'}).text[16:]
         date = publish_element.find('span',attrs={'class':'epub-section__date'}).text.strip()
         abstract = soup.find('div',attrs={'class':'abstractSection abstractInFull'}).find('p').get_text(strip=True)
-        meta_elements = soup.find_all('meta')
-
-        relevant_paper = ['citation_title', 'citation_issue', 'citation_volume', 'citation_firstpage', 'citation_lastpage', 'citation_publication_date', 'citation_abstract']
-        filtered_elements_paper = [m for m in meta_elements if m.get('name', '') in relevant_paper]
 
         currentpaper = {
-            'title': title,
-            'abstract': abstract,
+            'title': self.meta_last('citation_title', title),
+            'abstract': abstract or self.meta_last('citation_abstract', abstract),
             'doi': self.doi,
-            'volume': [],
-            'issue': [],
-            'start': [],
-            'end': [],
-            'date': date,
+            'volume': self.meta_last('citation_volume', []),
+            'issue': self.meta_last('citation_issue', []),
+            'start': self.meta_last('citation_firstpage', []),
+            'end': self.meta_last('citation_lastpage', []),
+            'date': self.meta_last('citation_publication_date', date),
             'author': self.authors[0],
-            'year': date[:4]
+            'year': self.meta_last('citation_publication_date', date[:4])
         }
-        for e in filtered_elements_paper:
-            if e['name'] == 'citation_title':
-                currentpaper['title'] = e['content']
-            if e['name'] == 'citation_volume':
-                currentpaper['volume'] = e['content']
-            if e['name'] == 'citation_issue':
-                currentpaper['issue'] = e['content']
-            if e['name'] == 'citation_firstpage':
-                currentpaper['start'] = e['content']
-            if e['name'] == 'citation_lastpage':
-                currentpaper['end'] = e['content']
-            if e['name'] == 'citation_publication_date':
-                currentpaper['date'] = e['content']
-                currentpaper['year'] = e['content']
-            if e['name'] == 'citation_abstract' and not abstract:
-                currentpaper['abstract'] = e['content']
         #        print(type(currentpaper))
         self.paper = currentpaper
 
@@ -0,0 +1,152 @@
+import threading
+import time
+from urllib.parse import urlparse
+
+# responses with these status codes mean the publisher wants us to slow down
+THROTTLE_CODES = (403, 429, 503)
+
+# text fragments of bot-check and captcha interstitials
+CHALLENGE_MARKERS = (
+    '<title>Validate User</title>',
+    '<title>Just a moment...</title>',
+    'Are you a robot',
+    'Pardon Our Interruption',
+)
+
+
+def is_challenge(page):
+    return any(marker in page for marker in CHALLENGE_MARKERS)
+
+
+def parse_retry_after(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_quota(headers):
+    # X-RateLimit-Remaining/-Reset as sent by the Elsevier APIs,
+    # reset is a unix timestamp; missing headers give None
+    remaining = parse_retry_after(headers.get('X-RateLimit-Remaining'))
+    reset = parse_retry_after(headers.get('X-RateLimit-Reset'))
+    return int(remaining) if remaining is not None else None, reset
+
+
+class QuotaExhausted(Exception):
+    # the api quota is used up until the unix time `reset`; whoever catches it
+    # can add where to resume once the quota is back
+    def __init__(self, url, reset):
+        super().__init__(f"quota for {urlparse(url).netloc} exhausted until "
+                         f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(reset))}")
+        self.url = url
+        self.reset = reset
+
+
+class RetriesExhausted(QuotaExhausted):
+    # still answered with 429 after the last retry, without a used up quota;
+    # reset is unknown, so it is None
+    def __init__(self, url, retries):
+        Exception.__init__(self, f"{urlparse(url).netloc} still rate limited after {retries} retries")
+        self.url = url
+        self.reset = None
+
+
+class _HostBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0
+
+
+class HostRateLimiter:
+    # Token bucket per host with AIMD rate control: every healthy response raises
+    # the host's rate by `increase` requests per second, every throttled response
+    # or challenge page multiplies it by `decrease`.
+    def __init__(self, initial_rate=1.0, min_rate=0.05, max_rate=10.0,
+                 increase=0.1, decrease=0.5, burst=1):
+        self.initial_rate = initial_rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.burst = burst
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_delay(cls, delay, **kwargs):
+        # start at the pace the fixed `delay` between requests used to give
+        return cls(initial_rate=1 / delay if delay else kwargs.get('max_rate', 10.0), **kwargs)
+
+    # locks cannot be pickled, multiprocessing workers get their own
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _bucket(self, url):
+        host = urlparse(url).netloc
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            bucket = _HostBucket(self.initial_rate, self.burst)
+            self._buckets[host] = bucket
+        return bucket
+
+    def rate(self, url):
+        with self._lock:
+            return self._bucket(url).rate
+
+    def wait(self, url):
+        while True:
+            with self._lock:
+                bucket = self._bucket(url)
+                now = time.monotonic()
+                bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated) * bucket.rate)
+                bucket.updated = now
+                if now >= bucket.blocked_until and bucket.tokens >= 1:
+                    bucket.tokens -= 1
+                    return
+                pause = max(bucket.blocked_until - now, (1 - bucket.tokens) / bucket.rate)
+            time.sleep(pause)
+
+    def success(self, url):
+        with self._lock:
+            bucket = self._bucket(url)
+            bucket.rate = min(self.max_rate, bucket.rate + self.increase)
+
+    def throttled(self, url, retry_after=None):
+        with self._lock:
+            bucket = self._bucket(url)
+            bucket.rate = max(self.min_rate, bucket.rate * self.decrease)
+            bucket.tokens = min(bucket.tokens, 0)
+            if retry_after:
+                bucket.blocked_until = max(bucket.blocked_until, time.monotonic() + retry_after)
+        print(f"..slowing down {urlparse(url).netloc} to {self.rate(url):.2f} requests/s")
+
+    def quota(self, url, remaining, reset, max_pause=None):
+        # Requests left until the quota resets at the unix time `reset`. Once none are
+        # left the host is blocked until then, unless that is more than max_pause
+        # seconds away; returns the seconds until the reset.
+        with self._lock:
+            bucket = self._bucket(url)
+            if remaining is None or remaining > 0 or reset is None:
+                return 0
+            pause = max(0, reset - time.time())
+            if max_pause is not None and pause > max_pause:
+                return pause
+            bucket.blocked_until = max(bucket.blocked_until, time.monotonic() + pause)
+        print(f"..quota for {urlparse(url).netloc} used up, pausing {pause:.0f}s until it resets")
+        return pause
+
+    def feedback(self, url, status_code, challenge=False, retry_after=None):
+        if challenge or status_code in THROTTLE_CODES:
+            self.throttled(url, retry_after=retry_after)
+        elif status_code is not None and status_code < 400:
+            self.success(url)
+
@@ -0,0 +1,78 @@
+class Record:
+    # Fixed-field record with __slots__ instead of a per-instance dict. Large crawls
+    # keep tens of thousands of these around and send them to worker processes.
+    # Item access works like on the dicts they replace, so record['doi'] and
+    # record.get('doi') keep working; to_dict() gives a plain dict.
+    __slots__ = ()
+
+    def __init__(self, *args, **kwargs):
+        for name, value in zip(self.__slots__, args):
+            setattr(self, name, value)
+        for name in self.__slots__[len(args):]:
+            setattr(self, name, kwargs.pop(name, None))
+        if kwargs:
+            raise TypeError(f'{type(self).__name__} has no fields {", ".join(kwargs)}')
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except (AttributeError, TypeError):
+            raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in self.__slots__
+
+    def get(self, key, default=None):
+        return getattr(self, key, default) if key in self.__slots__ else default
+
+    def keys(self):
+        return self.__slots__
+
+    def values(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def items(self):
+        return zip(self.__slots__, self.values())
+
+    def update(self, fields):
+        for key, value in fields.items():
+            self[key] = value
+
+    def copy(self):
+        return type(self)(*self.values())
+
+    def to_dict(self):
+        return dict(self.items())
+
+    # pickled as the class and a tuple of values, without repeating the field names
+    def __reduce__(self):
+        return type(self), self.values()
+
+    def __eq__(self, other):
+        if isinstance(other, Record):
+            return type(self) is type(other) and self.values() == other.values()
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    def __repr__(self):
+        return f'{type(self).__name__}({", ".join(f"{k}={v!r}" for k, v in self.items())})'
+
+
+class ArticleRecord(Record):
+    __slots__ = ('publisher', 'journal', 'journal_shortname', 'doi', 'title', 'year', 'preview_url', 'fulltext_url')
+
+
+class DownloadJob(Record):
+    # refresh, etag and last_modified are set for conditional re-checks of done downloads
+    __slots__ = ('url', 'doi', 'target', 'refresh', 'etag', 'last_modified')
+
+
+def as_dict(record):
+    # a new dict for a record or a plain dict, used to build job results
+    return record.to_dict() if isinstance(record, Record) else dict(record)
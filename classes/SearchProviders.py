@@ -1,18 +1,16 @@
 from urllib.parse import urlencode, quote_plus
-from bs4 import BeautifulSoup
-
-from .Utils import get_user_agent, strip_html
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-import undetected_chromedriver as uc
-import requests
+
+from .Utils import get_user_agent, strip_html, normalize_doi, normalize_url, make_soup
+from .Indexes import DOIIndex
+from .Records import ArticleRecord
+from .Sessions import get_session
+from .Browsers import BrowserPool, wait_for
 import json
 import math
-import time
-import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
-def get_search_provider(publisher, shortname, identifiers, binary_location, keywords, year_range=(2018, 2021)):
+def get_search_provider(publisher, shortname, identifiers, binary_location=None, keywords=None, year_range=(2018, 2021), cache=None, doi_index=None):
     sp_map = {
         'elsevier': ElsevierSearch,
         'springer': SpringerSearch,
@@ -24,32 +22,89 @@ def get_search_provider(publisher, shortname, identifiers, binary_location, keyw
         'INFORMS': INFORMSSearch
     }
     Provider = sp_map.get(publisher, lambda sn, ids, year_range: "Search provider does not exist")
-    return Provider(shortname, identifiers, binary_location, keywords, year_range=year_range)
+    provider = Provider(shortname, identifiers, binary_location, keywords, year_range=year_range)
+    if cache is not None:
+        provider.cache = cache
+    if doi_index is not None:
+        provider.doi_index = doi_index
+    return provider
 
 
 class SearchProvider:
-    def __init__(self, journal_shortname, journal_identifiers, binary_location , keywords, year_range=(), article_types=None, exclusions=None):
+    # seconds to wait for the results of a rendered search page
+    ready_timeout = 10
+    # providers that render their search pages in Chrome
+    uses_browser = False
+    # upper bound for parallel Chrome instances in a concurrent search
+    max_browsers = 3
+    # parallel requests for the remaining result pages of one query
+    page_concurrency = 4
+    # results come sorted newest first, required for incremental searches
+    newest_first = False
+    # parse result pages with lxml, keeping only the parse_targets elements
+    fast_parse = False
+    # (tag name, attrs) of the result list and pagination elements the parser reads
+    parse_targets = ()
+
+    def __init__(self, journal_shortname, journal_identifiers, binary_location=None, keywords=None, year_range=(), article_types=None, exclusions=None):
         self.journal_shortname = journal_shortname
         self.journal_identifiers = journal_identifiers
         self.start_year, self.end_year = year_range
         self.article_types = article_types
         self.exclusions = exclusions
         self.keywords = keywords
+        self.binary_location = binary_location
+        self.session = get_session()
+        # a ResponseCache for result pages, rendered pages included
+        self.cache = None
+        # drops duplicate articles, pass the same DOIIndex to several providers to dedupe across them
+        self.doi_index = DOIIndex()
         self.results = []
         self.search_conducted = False
         self.base_settings = self._get_base_settings()
         self.queries = self._generate_queries()
-        options = uc.ChromeOptions()
-        options.headless = False  # Headless is detectable – start with visible mode
-        options.add_argument(f"user-agent={get_user_agent()}")
-        options.add_argument("--window-size=1280,800")
-        options.add_argument("lang=en-US,en;q=0.9")
-        options.add_argument("--no-sandbox")
-        options.add_argument("--disable-gpu")
-        options.binary_location = binary_location
-        # Create driver
-        print("Binary location:", options.binary_location)
-        self.driver = uc.Chrome(options=options)
+        self._browser_pool = None
+        self._leased_drivers = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._watermarks = None
+        self._known_dois = None
+
+    @property
+    def driver(self):
+        # Chrome is only started by providers that render their search pages,
+        # the requests-based ones never touch this. Each thread of a concurrent
+        # search leases its own browser from the pool and keeps it until close().
+        driver = getattr(self._local, 'driver', None)
+        if driver is None:
+            with self._lock:
+                if self._browser_pool is None:
+                    print("Binary location:", self.binary_location)
+                    self._browser_pool = BrowserPool(size=self.max_browsers,
+                                                     binary_location=self.binary_location,
+                                                     extra_arguments=("--no-sandbox", "--disable-gpu"))
+                browser_pool = self._browser_pool
+            driver = browser_pool.acquire()
+            with self._lock:
+                self._leased_drivers.append(driver)
+            self._local.driver = driver
+        return driver
+
+    def close(self):
+        with self._lock:
+            browser_pool, self._browser_pool = self._browser_pool, None
+            leased_drivers, self._leased_drivers = self._leased_drivers, []
+            self._local = threading.local()
+        if browser_pool is not None:
+            for driver in leased_drivers:
+                browser_pool.release(driver)
+            browser_pool.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
     def _generate_queries(self):
         raise NotImplemented('You need to implement this method in a sub-class.')
@@ -58,18 +113,134 @@ class SearchProvider:
         raise NotImplemented('You need to implement this method in a sub-class.')
 
     def _conduct_search(self, query):
+        # yields the list of articles found on each result page of the query
         raise NotImplemented('You need to implement this method in a sub-class.')
 
-    def search(self):
-        for query in self.queries:
-            self._conduct_search(query)
+    def _get(self, url):
+        if self.cache is not None:
+            cached = self.cache.get(url)
+            if cached is not None:
+                return cached
+        r = self.session.get(url, headers=get_user_agent())
+        if self.cache is not None and r.status_code == 200:
+            self.cache.put(url, r.content, r.encoding)
+        return r
+
+    def _soup(self, markup):
+        return make_soup(markup, self.parse_targets, fast=self.fast_parse)
+
+    def _render(self, url, selector, scroll=False):
+        # page source of a result page rendered in Chrome; only pages that showed
+        # the selector are cached, so challenge pages are fetched again next time
+        if self.cache is not None:
+            cached = self.cache.get(url)
+            if cached is not None:
+                return cached.text
+        self.driver.get(url)
+        ready = wait_for(self.driver, selector, self.ready_timeout)
+        if scroll:
+            self.driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+        page_source = self.driver.page_source
+        if self.cache is not None and ready:
+            self.cache.put(url, page_source)
+        return page_source
+
+    def _fetch_pages(self, urls):
+        # Yields the responses for urls in order. Providers call this once the page
+        # count of a query is known, so the remaining pages are requested in parallel.
+        # incremental searches may stop after any page, so nothing is fetched ahead
+        if self.page_concurrency <= 1 or len(urls) <= 1 or self._known_dois is not None:
+            for url in urls:
+                yield self._get(url)
+            return
+        executor = ThreadPoolExecutor(max_workers=self.page_concurrency)
+        try:
+            yield from executor.map(self._get, urls)
+        finally:
+            executor.shutdown(cancel_futures=True)
+
+    def _start_incremental(self, watermarks):
+        self._watermarks, self._known_dois = None, None
+        if watermarks is None:
+            return
+        if not self.newest_first:
+            print(f'{type(self).__name__} does not sort newest first, searching the full range')
+            return
+        self._watermarks = watermarks
+        self._known_dois = watermarks.known(type(self).__name__, self.journal_shortname)
+
+    @staticmethod
+    def _watermark_key(article):
+        # the normalized DOI, or the normalized preview url for articles without one
+        doi = normalize_doi(article.get('doi'))
+        if doi:
+            return doi
+        preview_url = article.get('preview_url')
+        return 'url:' + normalize_url(preview_url) if preview_url else None
+
+    def _iter_pages(self, query, dedupe=True):
+        # result pages, without the articles already found in this run if dedupe is set
+        pages = self._conduct_search(query)
+        try:
+            for page in pages:
+                if self._known_dois is not None:
+                    keys = [self._watermark_key(article) for article in page]
+                    # pages are newest first, everything after a fully known page is known too
+                    if page and all(key in self._known_dois for key in keys):
+                        print('..only known articles on this page, stopping')
+                        break
+                    # recorded before the page is handed out, a consumer may stop after it
+                    self._watermarks.add(type(self).__name__, self.journal_shortname, keys)
+                yield [article for article in page if self.doi_index.add(article)] if dedupe else page
+        finally:
+            pages.close()
+
+    def _run_query(self, query):
+        # search() dedupes when it merges the queries, so the same copy of a
+        # duplicate is kept no matter which query thread finishes first
+        return [article for page in self._iter_pages(query, dedupe=False) for article in page]
+
+    def iter_results(self, watermarks=None):
+        # Yields every article as soon as its result page is parsed, without
+        # collecting them in self.results. The browser is closed once the
+        # generator is exhausted or closed.
+        self._start_incremental(watermarks)
+        try:
+            for query in self.queries:
+                for page in self._iter_pages(query):
+                    yield from page
+        finally:
+            self.close()
+
+    def search(self, concurrency=1, watermarks=None):
+        # With concurrency > 1 the year queries run in parallel threads, browser
+        # providers use at most max_browsers of them. Results are merged in query
+        # order, so self.results is the same as for a sequential search.
+        # With watermarks (a SearchWatermarks store) the search is incremental:
+        # each query stops at the first page that holds only known articles.
+        if self.uses_browser:
+            concurrency = min(concurrency, self.max_browsers)
+        self._start_incremental(watermarks)
+        try:
+            if concurrency > 1:
+                with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                    for results in executor.map(self._run_query, self.queries):
+                        self.results.extend(article for article in results if self.doi_index.add(article))
+            else:
+                for query in self.queries:
+                    self.results.extend(article for article in self._run_query(query) if self.doi_index.add(article))
+        finally:
+            self.close()
+        self.doi_index.report()
         self.search_conducted = True
 
 
 class ElsevierSearch(SearchProvider):
-    def __init__(self, journal_shortname, journal_identifiers, year_range=(), article_types=('REV', 'FLA'),
+    newest_first = True
+
+    def __init__(self, journal_shortname, journal_identifiers, binary_location=None, keywords=None, year_range=(), article_types=('REV', 'FLA'),
                  exclusions=None):
-        super().__init__(journal_shortname, journal_identifiers, year_range, article_types, exclusions)
+        super().__init__(journal_shortname, journal_identifiers, binary_location, keywords, year_range, article_types, exclusions)
 
     def _get_base_settings(self):
         return {
@@ -93,50 +264,60 @@ class ElsevierSearch(SearchProvider):
             queries.append(query)
         return queries
 
+    def _page_url(self, query, start, limit):
+        return self.base_settings['search_url'] + urlencode(dict(query, offset=start, show=limit), quote_via=quote_plus)
+
+    def _parse_results(self, r):
+        try:
+            result = json.loads(r.text)
+        except json.decoder.JSONDecodeError:
+            print('institutional login required')
+            exit('error')
+
+        results = []
+        for article in result['searchResults']:
+            results.append(ArticleRecord(
+                publisher='elsevier',
+                journal=article['sourceTitle'],
+                journal_shortname=self.journal_shortname,
+                doi=article['doi'],
+                title=strip_html(article['title']),
+                year=int(article['publicationDate'][:4]),
+                preview_url=self.base_settings['download_base_url'] + article['link'],
+                fulltext_url=self.base_settings['download_base_url'] + article['pdf']['downloadLink'],
+            ))
+        return int(result['resultsFound']), results
+
     def _conduct_search(self, query):
         start = query['offset']
         limit = query['show']
-        num_results = -1
-        while num_results == -1 or num_results > start + limit:
-            if num_results != -1:
-                start += limit
-
-            print('..requesting results [%s, %s]' % (start+1, start + limit))
-            query.update({
-                'offset': start,
-                'show': limit
-            })
 
-            url = self.base_settings['search_url'] + urlencode(query, quote_via=quote_plus)
-            print(url)
-            r = requests.get(url, headers=get_user_agent())
+        print('..requesting results [%s, %s]' % (start+1, start + limit))
+        url = self._page_url(query, start, limit)
+        print(url)
+        r = self._get(url)
+        if r.status_code != 200:
+            return
+        num_results, results = self._parse_results(r)
+        yield results
+
+        # the number of results is known after the first page, the rest is requested at once
+        offsets = list(range(start + limit, num_results, limit))
+        for offset in offsets:
+            print('..requesting results [%s, %s]' % (offset+1, offset + limit))
+        for r in self._fetch_pages([self._page_url(query, offset, limit) for offset in offsets]):
             if r.status_code != 200:
                 break
-            try:
-                result = json.loads(r.text)
-            except json.decoder.JSONDecodeError:
-                print('institutional login required')
-                exit('error')
-
-            num_results = int(result['resultsFound'])
-
-            for article in result['searchResults']:
-                self.results.append({
-                    'publisher': 'elsevier',
-                    'journal': article['sourceTitle'],
-                    'journal_shortname': self.journal_shortname,
-                    'doi': article['doi'],
-                    'title': strip_html(article['title']),
-                    'year': int(article['publicationDate'][:4]),
-                    'preview_url': self.base_settings['download_base_url'] + article['link'],
-                    'fulltext_url': self.base_settings['download_base_url'] + article['pdf']['downloadLink'],
-                })
+            yield self._parse_results(r)[1]
 
 
 class SpringerSearch(SearchProvider):
-    def __init__(self, journal_shortname, journal_identifiers, year_range=(), article_types=None,
+    newest_first = True
+    parse_targets = (('ol', {'id': 'results-list'}), ('span', {'class': 'number-of-pages'}))
+
+    def __init__(self, journal_shortname, journal_identifiers, binary_location=None, keywords=None, year_range=(), article_types=None,
                  exclusions=('Erratum',)):
-        super().__init__(journal_shortname, journal_identifiers, year_range, article_types, exclusions)
+        super().__init__(journal_shortname, journal_identifiers, binary_location, keywords, year_range, article_types, exclusions)
 
     def _get_base_settings(self):
         return {
@@ -168,57 +349,67 @@ class SpringerSearch(SearchProvider):
 
         return queries
 
+    def _page_url(self, query, page):
+        return self.base_settings['search_url'] + str(page) + '?' + urlencode(query, quote_via=quote_plus)
+
+    def _parse_results(self, soup):
+        results = []
+        # search results
+        search_result_list = soup.find('ol', attrs={'id': 'results-list'})
+        for result in search_result_list.find_all('li'):
+            title = strip_html(result.h2.a.text)
+            preview_link = self.base_settings['download_base_url'] + result.h2.a['href']
+            doi = result.h2.a['href'].replace('/article/', '')
+            enumeration = result.find('p', attrs={'class': 'meta'}).find('span', attrs={'class': 'enumeration'})
+            journal = enumeration.a.text
+            year = int(enumeration.span.text[1:-1])
+            fulltext_link = self.base_settings['download_base_url'] + '/content/pdf/' + doi + '.pdf'
+
+            results.append(ArticleRecord(
+                publisher='springer',
+                journal=journal,
+                journal_shortname=self.journal_shortname,
+                doi=doi,
+                title=title,
+                year=year,
+                preview_url=preview_link,
+                fulltext_url=fulltext_link,
+            ))
+        return results
+
     def _conduct_search(self, query):
-        page = 0
-        max_page = 1
+        print('..requesting page', 1)
+        r = self._get(self._page_url(query, 1))
+        if r.status_code != 200:
+            print(r.status_code)
+            return
 
-        while page < max_page:
-            page += 1
+        soup = self._soup(r.content)
 
-            url = self.base_settings['search_url'] + str(page) + '?' + urlencode(query, quote_via=quote_plus)
-            # print(url)
+        # total number of pages
+        max_page = 1
+        element = soup.find('span', attrs={'class': 'number-of-pages'})
+        if element:
+            max_page = int(element.text)
+        yield self._parse_results(soup)
+
+        pages = range(2, max_page + 1)
+        for page in pages:
             print('..requesting page', page)
-            r = requests.get(url, headers=get_user_agent())
+        for r in self._fetch_pages([self._page_url(query, page) for page in pages]):
             if r.status_code != 200:
                 print(r.status_code)
                 break
-
-            soup = BeautifulSoup(r.content, 'html.parser')
-
-            # total number of pages
-            # print(url)
-            if page == 1:
-                element = soup.find('span', attrs={'class': 'number-of-pages'})
-                if element:
-                    max_page = int(element.text)
-
-            # search results
-            search_result_list = soup.find('ol', attrs={'id': 'results-list'})
-            for result in search_result_list.find_all('li'):
-                title = strip_html(result.h2.a.text)
-                preview_link = self.base_settings['download_base_url'] + result.h2.a['href']
-                doi = result.h2.a['href'].replace('/article/', '')
-                enumeration = result.find('p', attrs={'class': 'meta'}).find('span', attrs={'class': 'enumeration'})
-                journal = enumeration.a.text
-                year = int(enumeration.span.text[1:-1])
-                fulltext_link = self.base_settings['download_base_url'] + '/content/pdf/' + doi + '.pdf'
-
-                self.results.append({
-                    'publisher': 'springer',
-                    'journal': journal,
-                    'journal_shortname': self.journal_shortname,
-                    'doi': doi,
-                    'title': title,
-                    'year': year,
-                    'preview_url': preview_link,
-                    'fulltext_url': fulltext_link,
-                })
+            yield self._parse_results(self._soup(r.content))
 
 
 class WileySearch(SearchProvider):
-    def __init__(self, journal_shortname, journal_identifiers, year_range=(), article_types=None,
+    uses_browser = True
+    parse_targets = (('li', {'class': 'search__item'}), ('ul', {'class': 'pagination__list'}))
+
+    def __init__(self, journal_shortname, journal_identifiers, binary_location=None, keywords=None, year_range=(), article_types=None,
                  exclusions=('Corrigendum', 'Erratum', 'Issue Information')):
-        super().__init__(journal_shortname, journal_identifiers, year_range, article_types, exclusions)
+        super().__init__(journal_shortname, journal_identifiers, binary_location, keywords, year_range, article_types, exclusions)
 
     def _get_base_settings(self):
         return {
@@ -265,9 +456,7 @@ class WileySearch(SearchProvider):
 
             soup = BeautifulSoup(r.content, 'html.parser')
             """
-            self.driver.get(url)
-            time.sleep(5)  # wait for JS to load
-            soup = BeautifulSoup(self.driver.page_source, 'html.parser')
+            soup = self._soup(self._render(url, 'li.search__item'))
             # total number of pages
             # print(url)
             if page == 1:
@@ -275,6 +464,7 @@ class WileySearch(SearchProvider):
                 if ul_list:
                     max_page = len(ul_list.find_all('li'))
 
+            results = []
             # search results
             search_result_list = soup.find_all('li', attrs={'class': 'search__item'})
             for result in search_result_list:
@@ -305,22 +495,25 @@ class WileySearch(SearchProvider):
                 preview_link = self.base_settings['preview_base_url'] + doi
                 fulltext_link = self.base_settings['download_base_url'] + doi + '?download=true'
 
-                self.results.append({
-                    'publisher': 'wiley',
-                    'journal': journal,
-                    'journal_shortname': self.journal_shortname,
-                    'doi': doi,
-                    'title': title,
-                    'year': year,
-                    'preview_url': preview_link,
-                    'fulltext_url': fulltext_link,
-                })
+                results.append(ArticleRecord(
+                    publisher='wiley',
+                    journal=journal,
+                    journal_shortname=self.journal_shortname,
+                    doi=doi,
+                    title=title,
+                    year=year,
+                    preview_url=preview_link,
+                    fulltext_url=fulltext_link,
+                ))
+            yield results
 
 
 class TAndFSearch(SearchProvider):
-    def __init__(self, journal_shortname, journal_identifiers, year_range=(), article_types=None,
+    parse_targets = (('ol', {'class': 'search-results'}), ('li', {'class': 'pageLinks'}))
+
+    def __init__(self, journal_shortname, journal_identifiers, binary_location=None, keywords=None, year_range=(), article_types=None,
                  exclusions=('Correction', 'Editorial')):
-        super().__init__(journal_shortname, journal_identifiers, year_range, article_types, exclusions)
+        super().__init__(journal_shortname, journal_identifiers, binary_location, keywords, year_range, article_types, exclusions)
 
     def _get_base_settings(self):
         return {
@@ -346,59 +539,71 @@ class TAndFSearch(SearchProvider):
 
         return queries
 
-    def _conduct_search(self, query):
-        page = 0
-        max_page = 1
+    def _page_url(self, query, page):
+        # startPage counts from 0
+        return self.base_settings['search_url'] + urlencode(dict(query, startPage=page - 1), quote_via=quote_plus)
 
-        while page < max_page:
-            query.update({'startPage': page})
-            page += 1
-            print('page', page)
-            url = self.base_settings['search_url'] + urlencode(query, quote_via=quote_plus)
-            r = requests.get(url, headers=get_user_agent())
-            if r.status_code != 200:
-                break
+    def _parse_results(self, soup):
+        results = []
+        # search results
+        search_result_list = soup.find('ol', attrs={'class': 'search-results'})
+        for result in search_result_list.find_all('li', attrs={'class': 'search-article-tools'}):
 
-            soup = BeautifulSoup(r.content, 'html.parser')
+            title_element = result.find('span', attrs={'class': 'hlFld-Title'})
+            title = title_element.a.text
+            doi = title_element.a['href'].replace('/doi/full/', '')
 
-            # pages
-            if page == 1:
-                pageination_items = soup.find_all('li', attrs={'class': 'pageLinks'})
-                if pageination_items:
-                    max_page = len(pageination_items) - 1
+            journal = result.find('a', attrs={'class': 'searchResultJournal'}).text
 
-            # search results
-            search_result_list = soup.find('ol', attrs={'class': 'search-results'})
-            for result in search_result_list.find_all('li', attrs={'class': 'search-article-tools'}):
+            year_string = result.find('span', attrs={'class': 'publication-year'}).contents[1].strip()
+            year = year_string[-4:]
 
-                title_element = result.find('span', attrs={'class': 'hlFld-Title'})
-                title = title_element.a.text
-                doi = title_element.a['href'].replace('/doi/full/', '')
+            preview_link = self.base_settings['preview_base_url'] + '/doi/full/' + doi
+            fulltext_link = self.base_settings['preview_base_url'] + '/doi/pdf/' + doi
 
-                journal = result.find('a', attrs={'class': 'searchResultJournal'}).text
+            results.append(ArticleRecord(
+                publisher='tandf',
+                journal=journal,
+                journal_shortname=self.journal_shortname,
+                doi=doi,
+                title=title,
+                year=year,
+                preview_url=preview_link,
+                fulltext_url=fulltext_link,
+            ))
+        return results
 
-                year_string = result.find('span', attrs={'class': 'publication-year'}).contents[1].strip()
-                year = year_string[-4:]
+    def _conduct_search(self, query):
+        print('page', 1)
+        r = self._get(self._page_url(query, 1))
+        if r.status_code != 200:
+            return
+
+        soup = self._soup(r.content)
 
-                preview_link = self.base_settings['preview_base_url'] + '/doi/full/' + doi
-                fulltext_link = self.base_settings['preview_base_url'] + '/doi/pdf/' + doi
+        # pages
+        max_page = 1
+        pageination_items = soup.find_all('li', attrs={'class': 'pageLinks'})
+        if pageination_items:
+            max_page = len(pageination_items) - 1
+        yield self._parse_results(soup)
 
-                self.results.append({
-                    'publisher': 'tandf',
-                    'journal': journal,
-                    'journal_shortname': self.journal_shortname,
-                    'doi': doi,
-                    'title': title,
-                    'year': year,
-                    'preview_url': preview_link,
-                    'fulltext_url': fulltext_link,
-                })
+        pages = range(2, max_page + 1)
+        for page in pages:
+            print('page', page)
+        for r in self._fetch_pages([self._page_url(query, page) for page in pages]):
+            if r.status_code != 200:
+                break
+            yield self._parse_results(self._soup(r.content))
 
 
 class NatureSearch(SearchProvider):
-    def __init__(self, journal_shortname, journal_identifiers, year_range=(),
+    newest_first = True
+    parse_targets = (('ol', {'class': 'clean-list'}), ('div', {'class': 'filter-results'}))
+
+    def __init__(self, journal_shortname, journal_identifiers, binary_location=None, keywords=None, year_range=(),
                  article_types=('research', 'comments-and-opinion', 'reviews'), exclusions=None):
-        super().__init__(journal_shortname, journal_identifiers, year_range, article_types, exclusions)
+        super().__init__(journal_shortname, journal_identifiers, binary_location, keywords, year_range, article_types, exclusions)
 
     def _get_base_settings(self):
         return {
@@ -423,59 +628,71 @@ class NatureSearch(SearchProvider):
 
         return queries
 
-    def _conduct_search(self, query):
-        page = 0
-        max_page = 1
+    def _page_url(self, query, page):
+        return self.base_settings['search_url'] + urlencode(dict(query, page=page), quote_via=quote_plus)
 
-        while page < max_page:
-            page += 1
-            query.update({'page': page})
-            print('page', page)
-            url = self.base_settings['search_url'] + urlencode(query, quote_via=quote_plus)
-            r = requests.get(url, headers=get_user_agent())
-            if r.status_code != 200:
-                break
+    def _parse_results(self, soup):
+        results = []
+        # search results
+        search_result_list = soup.find('ol', attrs={'class': 'clean-list'})
+        for result in search_result_list.find_all('li', attrs={'itemtype': 'http://schema.org/Article'}):
 
-            soup = BeautifulSoup(r.content, 'html.parser')
+            title_element = result.find('h2', attrs={'itemprop': 'headline'})
+            title = title_element.a.text.strip()
 
-            # pages
-            if page == 1:
-                element = soup.find('div', attrs={'class': 'filter-results'})
-                if element:
-                    max_page = math.ceil(int(element.p.contents[3].text.strip()) / 50)
+            did = title_element.a['href'].replace('/articles/', '')
+            doi = '10.1038/' + did  # nature research always has the same prefix to form a doi
 
-            # search results
-            search_result_list = soup.find('ol', attrs={'class': 'clean-list'})
-            for result in search_result_list.find_all('li', attrs={'itemtype': 'http://schema.org/Article'}):
+            journal = result.find('a', attrs={'class': 'emphasis text-gray'}).text.strip()
 
-                title_element = result.find('h2', attrs={'itemprop': 'headline'})
-                title = title_element.a.text.strip()
+            year = result.find('time', attrs={'itemprop': 'datePublished'})['datetime'][:4]
 
-                did = title_element.a['href'].replace('/articles/', '')
-                doi = '10.1038/' + did  # nature research always has the same prefix to form a doi
+            preview_link = self.base_settings['preview_base_url'] + '/articles/' + did
+            fulltext_link = self.base_settings['preview_base_url'] + '/articles/' + did + '.pdf'
 
-                journal = result.find('a', attrs={'class': 'emphasis text-gray'}).text.strip()
+            results.append(ArticleRecord(
+                publisher='nature',
+                journal=journal,
+                journal_shortname=self.journal_shortname,
+                doi=doi,
+                title=title,
+                year=year,
+                preview_url=preview_link,
+                fulltext_url=fulltext_link,
+            ))
+        return results
 
-                year = result.find('time', attrs={'itemprop': 'datePublished'})['datetime'][:4]
+    def _conduct_search(self, query):
+        print('page', 1)
+        r = self._get(self._page_url(query, 1))
+        if r.status_code != 200:
+            return
 
-                preview_link = self.base_settings['preview_base_url'] + '/articles/' + did
-                fulltext_link = self.base_settings['preview_base_url'] + '/articles/' + did + '.pdf'
+        soup = self._soup(r.content)
 
-                self.results.append({
-                    'publisher': 'nature',
-                    'journal': journal,
-                    'journal_shortname': self.journal_shortname,
-                    'doi': doi,
-                    'title': title,
-                    'year': year,
-                    'preview_url': preview_link,
-                    'fulltext_url': fulltext_link,
-                })
+        # pages
+        max_page = 1
+        element = soup.find('div', attrs={'class': 'filter-results'})
+        if element:
+            max_page = math.ceil(int(element.p.contents[3].text.strip()) / 50)
+        yield self._parse_results(soup)
+
+        pages = range(2, max_page + 1)
+        for page in pages:
+            print('page', page)
+        for r in self._fetch_pages([self._page_url(query, page) for page in pages]):
+            if r.status_code != 200:
+                break
+            yield self._parse_results(self._soup(r.content))
 
 
 class OxfordSearch(SearchProvider):
-    def __init__(self, journal_shortname, journal_identifiers, year_range=(), article_types=('Research Article',), exclusions=None):
-        super().__init__(journal_shortname, journal_identifiers, year_range, article_types, exclusions)
+    uses_browser = True
+    newest_first = True
+    parse_targets = (('div', {'class': 'al-article-box'}), ('div', {'class': 'sr-statistics'}))
+
+    def __init__(self, journal_shortname, journal_identifiers, binary_location=None, keywords=None, year_range=(), article_types=('Research Article',), exclusions=None):
+        super().__init__(journal_shortname, journal_identifiers, binary_location, keywords, year_range, article_types, exclusions)
 
     def _get_base_settings(self):
         return {
@@ -517,10 +734,7 @@ class OxfordSearch(SearchProvider):
                 break   
             soup = BeautifulSoup(r.content, 'html.parser')
             """
-            self.driver.get(url)
-            time.sleep(5)  # wait for JS to load
-            self.driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-            soup = BeautifulSoup(self.driver.page_source, 'html.parser')
+            soup = self._soup(self._render(url, 'div.al-article-box', scroll=True))
             # pages
             if page == 1:
                 element = soup.find('div', attrs={'class': 'sr-statistics'})
@@ -535,6 +749,7 @@ class OxfordSearch(SearchProvider):
 
                     max_page = math.ceil(max_results / results_per_page)
 
+            results = []
             # search results
             for result in soup.find_all('div', attrs={'class': 'al-article-box'}):
                 title_box = result.find('h4', attrs={'class': 'sri-title'})
@@ -548,19 +763,23 @@ class OxfordSearch(SearchProvider):
 
                 year = int(result.find('div', attrs={'al-pub-date'}).contents[-1][-4:].strip())
 
-                self.results.append({
-                    'publisher': 'oxford',
-                    'journal': journal,
-                    'journal_shortname': self.journal_shortname,
-                    'doi': doi,
-                    'title': title,
-                    'year': year,
-                    'preview_url': preview_link,
-                    'fulltext_url': None,  # there appears to be one on the preview page, but it won't work.
-                })
+                results.append(ArticleRecord(
+                    publisher='oxford',
+                    journal=journal,
+                    journal_shortname=self.journal_shortname,
+                    doi=doi,
+                    title=title,
+                    year=year,
+                    preview_url=preview_link,
+                    fulltext_url=None,  # there appears to be one on the preview page, but it won't work.
+                ))
+            yield results
 
 
 class CambridgeSearch(SearchProvider):
+    newest_first = True
+    parse_targets = (('div', {'class': 'product-listing-with-inputs-content'}), ('ul', {'class': 'pagination'}))
+
     def _get_base_settings(self):
         return {
             'search_url': 'https://www.cambridge.org/core/what-we-publish/journals/listing?',
@@ -586,79 +805,92 @@ class CambridgeSearch(SearchProvider):
 
         return queries
 
+    def _page_url(self, query, page):
+        return self.base_settings['search_url'] + urlencode(dict(query, pageNum=page), quote_via=quote_plus)
+
+    def _parse_results(self, soup):
+        results = []
+        # search results
+        for result in soup.find_all('div', attrs={'class': 'product-listing-with-inputs-content'}):
+            details = result.find('ul', attrs={'class': 'details'})
+
+            doi_element = result.find('div', attrs={'data-doi': True})
+            if doi_element:
+                doi = doi_element['data-doi']
+            else:
+                doi = None
+
+            title_box = details.find('li', attrs={'class': 'title'})
+            title = title_box.h3.a.text.strip()
+
+            # sort out cover and back matters etc
+            if all([e in title.lower() for e in ['issue', 'volume', 'matter']]):
+                continue
+
+            preview_url = self.base_settings['preview_url'] + title_box.h3.a['href']
+
+            #source_box = details.find('dt', attrs={'class': 'source'})
+            journal = details.find('a', attrs={'class': 'productParent'}).text
+
+            published_box = details.find('dt', attrs={'class': 'published'})
+            published_box_dd = published_box.find_next_sibling('dd')
+            year_box = published_box_dd.find('span', attrs={'class': 'date'})
+            year = int(year_box.text[-4:])
+
+            link_box = details.find('li', attrs={'class': None})
+            access_element = link_box.find('div', attrs={'class': 'access-modal'})
+
+            download_element = link_box.find('a', attrs={'data-pdf-content-id': True})
+            if download_element:
+                fulltext_url = self.base_settings['preview_url'] + download_element['href']
+            else:
+                fulltext_url = None
+
+            results.append(ArticleRecord(
+                publisher='cambridge',
+                journal=journal,
+                journal_shortname=self.journal_shortname,
+                doi=doi,
+                title=title,
+                year=year,
+                preview_url=preview_url,
+                fulltext_url=fulltext_url,
+            ))
+        return results
+
     def _conduct_search(self, query):
-        page = 0
-        max_page = 1
+        print('page', 1)
+        url = self._page_url(query, 1)
+        print(url)
+        r = self._get(url)
+        if r.status_code != 200:
+            print(f"error:{r.status_code}")
+            return
 
-        while page < max_page:
-            page += 1
-            query.update({'pageNum': page})
-            print('page', page)
+        soup = self._soup(r.content)
 
-            url = self.base_settings['search_url'] + urlencode(query, quote_via=quote_plus)
-            print(url)
-            r = requests.get(url, headers=get_user_agent())
+        # pages
+        max_page = 1
+        element = soup.find('ul', attrs={'class': 'pagination'})
+        if element:
+            li_items = element.find_all('li')
+            max_page = int(li_items[-1].a['data-page-number'])
+        yield self._parse_results(soup)
+
+        pages = range(2, max_page + 1)
+        for page in pages:
+            print('page', page)
+        for r in self._fetch_pages([self._page_url(query, page) for page in pages]):
             if r.status_code != 200:
                 print(f"error:{r.status_code}")
                 break
-            
-            soup = BeautifulSoup(r.content, 'html.parser')
-
-            # pages
-            if page == 1:
-                element = soup.find('ul', attrs={'class': 'pagination'})
-                if element:
-                    li_items = element.find_all('li')
-                    max_page = int(li_items[-1].a['data-page-number'])
-
-            # search results
-            for result in soup.find_all('div', attrs={'class': 'product-listing-with-inputs-content'}):
-                details = result.find('ul', attrs={'class': 'details'})
-
-                doi_element = result.find('div', attrs={'data-doi': True})
-                if doi_element:
-                    doi = doi_element['data-doi']
-                else:
-                    doi = None
-
-                title_box = details.find('li', attrs={'class': 'title'})
-                title = title_box.h3.a.text.strip()
-
-                # sort out cover and back matters etc
-                if all([e in title.lower() for e in ['issue', 'volume', 'matter']]):
-                    continue
-
-                preview_url = self.base_settings['preview_url'] + title_box.h3.a['href']
-
-                #source_box = details.find('dt', attrs={'class': 'source'})
-                journal = details.find('a', attrs={'class': 'productParent'}).text
-
-                published_box = details.find('dt', attrs={'class': 'published'})
-                published_box_dd = published_box.find_next_sibling('dd')
-                year_box = published_box_dd.find('span', attrs={'class': 'date'})
-                year = int(year_box.text[-4:])
-
-                link_box = details.find('li', attrs={'class': None})
-                access_element = link_box.find('div', attrs={'class': 'access-modal'})
-
-                download_element = link_box.find('a', attrs={'data-pdf-content-id': True})
-                if download_element:
-                    fulltext_url = self.base_settings['preview_url'] + download_element['href']
-                else:
-                    fulltext_url = None
-
-                self.results.append({
-                    'publisher': 'cambridge',
-                    'journal': journal,
-                    'journal_shortname': self.journal_shortname,
-                    'doi': doi,
-                    'title': title,
-                    'year': year,
-                    'preview_url': preview_url,
-                    'fulltext_url': fulltext_url,
-                })
+            yield self._parse_results(self._soup(r.content))
 
 class INFORMSSearch(SearchProvider):
+    uses_browser = True
+    parse_targets = (('ul', {'class': 'rlist search-result__body items-results'}),
+                     ('ul', {'class': 'rlist--inline pagination__list'}))
+
     def _get_base_settings(self):
         return {
             'search_url': 'https://pubsonline.informs.org/action/doSearch?',
@@ -709,10 +941,7 @@ class INFORMSSearch(SearchProvider):
 
             url = self.base_settings['search_url'] + urlencode(query, quote_via=quote_plus)
             print(url)
-            self.driver.get(url)
-            time.sleep(5)  # wait for JS to load
-            self.driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-            soup = BeautifulSoup(self.driver.page_source, 'html.parser')
+            soup = self._soup(self._render(url, 'li.search__item', scroll=True))
             query.update({'startPage': page})
             # pages
             if page == 1:
@@ -721,6 +950,7 @@ class INFORMSSearch(SearchProvider):
                     li_items = element.find_all('li')
                     max_page = int(li_items[-1].a.text)
 
+            results = []
             # search results
             result_ul = soup.find('ul',attrs={'class':'rlist search-result__body items-results'})
             for result in result_ul.find_all('li', attrs={'class': 'clearfix separator search__item'}):
@@ -751,13 +981,14 @@ class INFORMSSearch(SearchProvider):
                 
                 fulltext_url = self.base_settings['base_url'] + result.find('li',attrs={'class':'pdfLink'}).a["href"]
 
-                self.results.append({
-                    'publisher': 'INFORMS',
-                    'journal': journal,
-                    'journal_shortname': self.journal_shortname,
-                    'doi': doi,
-                    'title': title,
-                    'year': year,
-                    'preview_url': preview_url,
-                    'fulltext_url': fulltext_url,
-                })
+                results.append(ArticleRecord(
+                    publisher='INFORMS',
+                    journal=journal,
+                    journal_shortname=self.journal_shortname,
+                    doi=doi,
+                    title=title,
+                    year=year,
+                    preview_url=preview_url,
+                    fulltext_url=fulltext_url,
+                ))
+            yield results
@@ -0,0 +1,54 @@
+import os
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+# keep-alive connections kept open per host
+DEFAULT_POOL_SIZE = 32
+# number of hosts a session keeps a connection pool for
+DEFAULT_POOL_CONNECTIONS = 16
+
+# hosts we hit with many parallel requests get bigger pools
+HOST_POOL_SIZES = {
+    'https://www.sciencedirect.com': 64,
+    'https://api.elsevier.com': 64,
+    'https://link.springer.com': 64,
+    'https://www.cambridge.org': 64,
+}
+
+_sessions = {}
+_lock = threading.Lock()
+
+
+def make_session(pool_size=DEFAULT_POOL_SIZE, host_pool_sizes=None):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=DEFAULT_POOL_CONNECTIONS, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+
+    # requests picks the adapter with the longest matching prefix,
+    # so these take precedence over the generic ones above
+    for prefix, size in (HOST_POOL_SIZES if host_pool_sizes is None else host_pool_sizes).items():
+        session.mount(prefix, HTTPAdapter(pool_connections=1, pool_maxsize=size))
+    return session
+
+
+def get_session():
+    # One pooled session per process. Connections (and with them the TLS session)
+    # are kept alive and reused across requests to the same host.
+    # Worker processes of a multiprocessing pool get their own session,
+    # since sockets must not be shared across a fork.
+    pid = os.getpid()
+    with _lock:
+        session = _sessions.get(pid)
+        if session is None:
+            session = make_session()
+            _sessions[pid] = session
+    return session
+
+
+def close_sessions():
+    with _lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
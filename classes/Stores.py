@@ -0,0 +1,416 @@
+import atexit
+import gzip
+import hashlib
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import zlib
+
+from .Utils import normalize_url, write_atomic
+
+# http codes that will not change on a retry
+PERMANENT_FAILURE_CODES = (400, 401, 404, 410)
+
+
+class SQLiteStore:
+    # Base for the small sqlite files we keep between runs. The connection is
+    # opened lazily and shared by all threads of a process behind a lock; it is
+    # not pickled, so multiprocessing workers open their own.
+    schema = ''
+    # columns added after a table was first released, {table: {column: type}}
+    added_columns = {}
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = None
+        self._lock = threading.RLock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_conn'] = None
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.row_factory = sqlite3.Row
+            self._conn.executescript(self.schema)
+            self._migrate()
+        return self._conn
+
+    def _migrate(self):
+        for table, columns in self.added_columns.items():
+            existing = {row['name'] for row in self._conn.execute(f'PRAGMA table_info({table})')}
+            for column, column_type in columns.items():
+                if column not in existing:
+                    self._conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {column_type}')
+        self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class DownloadManifest(SQLiteStore):
+    # One row per (doi, url) with the outcome of the last attempt. Jobs that are
+    # done or failed permanently are not scheduled again; failed jobs are retried
+    # until they reach max_attempts.
+    # The ETag/Last-Modified validators of every download are kept as well, so that
+    # done jobs can be re-checked with a conditional request once they are older
+    # than refresh_older_than seconds.
+    schema = """
+        CREATE TABLE IF NOT EXISTS downloads (
+            doi TEXT NOT NULL,
+            url TEXT NOT NULL,
+            target TEXT,
+            status TEXT,
+            code INTEGER,
+            bytes INTEGER,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            message TEXT,
+            created_at REAL,
+            updated_at REAL,
+            etag TEXT,
+            last_modified TEXT,
+            checked_at REAL,
+            PRIMARY KEY (doi, url)
+        );
+    """
+    added_columns = {
+        'downloads': {'etag': 'TEXT', 'last_modified': 'TEXT', 'checked_at': 'REAL'}
+    }
+
+    def __init__(self, path=os.path.join('logs', 'downloads.sqlite'), max_attempts=3):
+        super().__init__(path)
+        self.max_attempts = max_attempts
+
+    @staticmethod
+    def _key(job):
+        return job.get('doi') or '', job['url']
+
+    def _is_pending(self, row):
+        if row is None:
+            return True
+        if row['status'] == 'done':
+            return False
+        return row['attempts'] < self.max_attempts and row['code'] not in PERMANENT_FAILURE_CODES
+
+    def _is_stale(self, row, refresh_older_than):
+        if refresh_older_than is None or row is None or row['status'] != 'done':
+            return False
+        checked_at = row['checked_at'] or row['updated_at'] or 0
+        return time.time() - checked_at > refresh_older_than
+
+    def iter_pending(self, jobs, refresh_older_than=None):
+        with self._lock:
+            rows = {(row['doi'], row['url']): row for row in self.conn.execute('SELECT * FROM downloads')}
+
+        for job in jobs:
+            row = rows.get(self._key(job))
+            if self._is_stale(row, refresh_older_than):
+                job = job.copy()
+                job.update({'refresh': True, 'etag': row['etag'], 'last_modified': row['last_modified']})
+                yield job
+            elif self._is_pending(row):
+                yield job
+
+    def pending(self, jobs, refresh_older_than=None):
+        return list(self.iter_pending(jobs, refresh_older_than=refresh_older_than))
+
+    def record(self, job_result):
+        doi, url = self._key(job_result)
+        now = time.time()
+        done = job_result.get('downloaded') or job_result.get('message') in ('file exists', 'unchanged')
+        size = None
+        if done and os.path.isfile(job_result['target']):
+            size = os.path.getsize(job_result['target'])
+        code = job_result.get('code')
+        with self._lock, self.conn:
+            # a 304 or a failed refresh keeps the validators of the file on disk
+            self.conn.execute("""
+                INSERT INTO downloads (doi, url, target, status, code, bytes, attempts, message, created_at, updated_at,
+                                       etag, last_modified, checked_at)
+                VALUES (?, ?, ?, ?, ?, ?, 1, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (doi, url) DO UPDATE SET
+                    target = excluded.target,
+                    status = excluded.status,
+                    code = excluded.code,
+                    bytes = excluded.bytes,
+                    attempts = downloads.attempts + 1,
+                    message = excluded.message,
+                    updated_at = excluded.updated_at,
+                    etag = COALESCE(excluded.etag, downloads.etag),
+                    last_modified = COALESCE(excluded.last_modified, downloads.last_modified),
+                    checked_at = excluded.checked_at
+            """, (doi, url, job_result['target'], 'done' if done else 'failed',
+                  code if isinstance(code, int) else None, size, job_result.get('message'), now, now,
+                  job_result.get('etag'), job_result.get('last_modified'), now))
+
+    def counts(self):
+        with self._lock:
+            return {row['status']: row['n'] for row in
+                    self.conn.execute('SELECT status, COUNT(*) AS n FROM downloads GROUP BY status')}
+
+
+class SearchWatermarks(SQLiteStore):
+    # DOIs we already found per search provider and journal, articles without a
+    # DOI are kept as 'url:' and their normalized preview url. Incremental searches
+    # stop paging a query once a whole result page consists of known articles.
+    schema = """
+        CREATE TABLE IF NOT EXISTS known_dois (
+            provider TEXT NOT NULL,
+            journal TEXT NOT NULL,
+            doi TEXT NOT NULL,
+            first_seen REAL,
+            PRIMARY KEY (provider, journal, doi)
+        );
+    """
+
+    def __init__(self, path=os.path.join('logs', 'search_watermarks.sqlite')):
+        super().__init__(path)
+
+    def known(self, provider, journal):
+        with self._lock:
+            return {row['doi'] for row in self.conn.execute(
+                'SELECT doi FROM known_dois WHERE provider = ? AND journal = ?', (provider, journal))}
+
+    def add(self, provider, journal, dois):
+        now = time.time()
+        with self._lock, self.conn:
+            self.conn.executemany(
+                'INSERT OR IGNORE INTO known_dois (provider, journal, doi, first_seen) VALUES (?, ?, ?, ?)',
+                [(provider, journal, doi, now) for doi in dois if doi])
+
+
+class CachedResponse:
+    # the parts of a requests.Response the search providers read
+    status_code = 200
+
+    def __init__(self, url, content, encoding=None):
+        self.url = url
+        self.content = content
+        self.encoding = encoding
+        self.headers = {}
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding or 'utf-8', errors='replace')
+
+
+class ResponseCache(SQLiteStore):
+    # zlib compressed response bodies on disk, keyed by the normalized url. Entries
+    # expire after ttl seconds; once the files exceed max_bytes the least recently
+    # used ones are removed.
+    schema = """
+        CREATE TABLE IF NOT EXISTS responses (
+            key TEXT PRIMARY KEY,
+            url TEXT,
+            encoding TEXT,
+            bytes INTEGER,
+            created_at REAL,
+            accessed_at REAL
+        );
+    """
+
+    def __init__(self, directory=os.path.join('cache', 'responses'), ttl=7 * 24 * 3600, max_bytes=512 * 1024 ** 2):
+        super().__init__(os.path.join(directory, 'index.sqlite'))
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def _key(url):
+        return hashlib.sha1(normalize_url(url).encode('utf-8')).hexdigest()
+
+    def _file(self, key):
+        return os.path.join(self.directory, key[:2], key + '.z')
+
+    def _remove(self, key):
+        self.conn.execute('DELETE FROM responses WHERE key = ?', (key,))
+        try:
+            os.remove(self._file(key))
+        except FileNotFoundError:
+            pass
+
+    def get(self, url):
+        key = self._key(url)
+        now = time.time()
+        with self._lock, self.conn:
+            row = self.conn.execute('SELECT * FROM responses WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            if self.ttl is not None and now - row['created_at'] > self.ttl:
+                self._remove(key)
+                return None
+            try:
+                with open(self._file(key), 'rb') as f:
+                    content = zlib.decompress(f.read())
+            except (OSError, zlib.error):
+                self._remove(key)
+                return None
+            self.conn.execute('UPDATE responses SET accessed_at = ? WHERE key = ?', (now, key))
+        return CachedResponse(url, content, row['encoding'])
+
+    def put(self, url, content, encoding=None):
+        if isinstance(content, str):
+            content, encoding = content.encode('utf-8'), 'utf-8'
+        key = self._key(url)
+        data = zlib.compress(content)
+        os.makedirs(os.path.dirname(self._file(key)), exist_ok=True)
+        write_atomic(self._file(key), data)
+        now = time.time()
+        with self._lock, self.conn:
+            self.conn.execute("""
+                INSERT OR REPLACE INTO responses (key, url, encoding, bytes, created_at, accessed_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (key, url, encoding, len(data), now, now))
+            self._evict()
+
+    def _evict(self):
+        total = self.conn.execute('SELECT COALESCE(SUM(bytes), 0) FROM responses').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for row in self.conn.execute('SELECT key, bytes FROM responses ORDER BY accessed_at').fetchall():
+            self._remove(row['key'])
+            total -= row['bytes']
+            if total <= self.max_bytes:
+                break
+
+    def clear(self):
+        with self._lock, self.conn:
+            for row in self.conn.execute('SELECT key FROM responses').fetchall():
+                self._remove(row['key'])
+
+
+class ArticleCache(SQLiteStore):
+    # Article api responses by DOI. Published articles do not change, so entries
+    # never expire unless max_age (seconds) is set. hits and misses count lookups.
+    schema = """
+        CREATE TABLE IF NOT EXISTS articles (
+            doi TEXT PRIMARY KEY,
+            data TEXT NOT NULL,
+            fetched_at REAL
+        );
+    """
+
+    def __init__(self, path=os.path.join('logs', 'articles.sqlite'), max_age=None):
+        super().__init__(path)
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, doi):
+        with self._lock:
+            row = self.conn.execute('SELECT data, fetched_at FROM articles WHERE doi = ?', (doi,)).fetchone()
+            if row is None or (self.max_age is not None and time.time() - row['fetched_at'] > self.max_age):
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(row['data'])
+
+    def put(self, doi, data):
+        with self._lock, self.conn:
+            self.conn.execute('INSERT OR REPLACE INTO articles (doi, data, fetched_at) VALUES (?, ?, ?)',
+                              (doi, json.dumps(data, ensure_ascii=False), time.time()))
+
+    def report(self):
+        print(f'..article cache: {self.hits} hits, {self.misses} misses')
+
+
+class RawResponseArchive:
+    # Append-only gzip compressed JSON lines with the raw api responses, one
+    # {'kind', 'key', 'time', 'data'} object per line. add() only queues a record;
+    # a background thread writes whatever is queued as one gzip member and flushes
+    # it, so records reach the disk while the run goes on. Pending records are
+    # written on close(), which also runs at interpreter exit.
+    # Reading stops at a member cut off by a crash; a closed archive takes no
+    # more records.
+    batch_size = 500
+
+    def __init__(self, path=os.path.join('logs', 'raw_responses.jsonl.gz')):
+        self.path = path
+        self._queue = queue.Queue()
+        self._writer = None
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def add(self, kind, key, data):
+        # the record is queued under the lock, so it can not land behind the
+        # sentinel close() puts
+        with self._lock:
+            if self._closed:
+                raise ValueError(f'{self.path} is closed')
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write, daemon=True)
+                self._writer.start()
+                atexit.register(self.close)
+            self._queue.put({'kind': kind, 'key': key, 'time': time.time(), 'data': data})
+
+    def _write(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, 'ab') as f:
+            done = False
+            while not done:
+                records = [self._queue.get()]
+                while len(records) < self.batch_size and records[-1] is not None:
+                    try:
+                        records.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if records[-1] is None:
+                    records.pop()
+                    done = True
+                if records:
+                    lines = ''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in records)
+                    f.write(gzip.compress(lines.encode('utf-8')))
+                    f.flush()
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            writer, self._writer = self._writer, None
+            if writer is not None:
+                self._queue.put(None)
+        if writer is not None:
+            writer.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _iter_lines(self):
+        if not os.path.isfile(self.path):
+            return
+        with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+            try:
+                yield from f
+            except (EOFError, gzip.BadGzipFile, zlib.error):
+                # a member cut off by a crash, the records before it are kept
+                return
+
+    def iter_records(self, kind=None):
+        for line in self._iter_lines():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if kind is None or record['kind'] == kind:
+                yield record
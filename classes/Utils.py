@@ -2,10 +2,13 @@ import os
 
 from re import sub
 from html import unescape
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
 from unidecode import unidecode
+from bs4 import BeautifulSoup, SoupStrainer
 from fake_useragent import UserAgent
 
 from .Constants import REPLACEMENTS, SPLITTERS
+from .Records import DownloadJob
 import random
 
 """
@@ -53,14 +56,101 @@ def make_download_target(article, fulltext=False, base_dir='files'):
             'ext': '.html'
         }
     }
-    return {
-        'url': article[ft_map[fulltext]['url']],
-        'target': os.path.join(base_dir,
-                               article['publisher'],
-                               article['journal_shortname'],
-                               ft_map[fulltext]['path'],
-                               article['doi'].replace('/', '--') + ft_map[fulltext]['ext'])
-    }
+    return DownloadJob(
+        url=article[ft_map[fulltext]['url']],
+        doi=article['doi'],
+        target=os.path.join(base_dir,
+                            article['publisher'],
+                            article['journal_shortname'],
+                            ft_map[fulltext]['path'],
+                            article['doi'].replace('/', '--') + ft_map[fulltext]['ext'])
+    )
+
+def _matches_target(name, attrs, targets):
+    for target_name, target_attrs in targets:
+        if target_name != name:
+            continue
+        for key, value in target_attrs.items():
+            actual = attrs.get(key)
+            if actual is None:
+                break
+            if key == 'class':
+                # every listed class has to be on the tag, in any order
+                actual = actual.split() if isinstance(actual, str) else actual
+                if not set(value.split()) <= set(actual):
+                    break
+            elif actual != value:
+                break
+        else:
+            return True
+    return False
+
+
+def make_soup(markup, targets=(), fast=False):
+    # fast parses with lxml and only builds the elements listed in targets, given as
+    # (tag name, attrs) pairs, together with everything inside them; find() and
+    # find_all() for these elements return the same as on the full document
+    if not fast:
+        return BeautifulSoup(markup, 'html.parser')
+    parse_only = SoupStrainer(lambda name, attrs: _matches_target(name, attrs, targets)) if targets else None
+    return BeautifulSoup(markup, 'lxml', parse_only=parse_only)
+
+
+def normalize_doi(doi):
+    # providers hand out dois as bare ids, /doi/ paths or resolver urls
+    if not doi:
+        return None
+    doi = doi.strip().lower()
+    for prefix in ('https://doi.org/', 'http://doi.org/', 'https://dx.doi.org/', 'http://dx.doi.org/', 'doi:', '/doi/'):
+        if doi.startswith(prefix):
+            doi = doi[len(prefix):]
+    return doi or None
+
+
+def normalize_url(url):
+    # same resource, same key: lowercase scheme and host, sorted query, no fragment
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path or '/', query, ''))
+
+
+def write_atomic(target, content, encoding='utf-8'):
+    # content is written next to the target and renamed once complete,
+    # so an interrupted write never leaves a file that looks finished
+    part = target + '.part'
+    try:
+        if isinstance(content, str):
+            with open(part, 'w', encoding=encoding) as f:
+                f.write(content)
+        else:
+            with open(part, 'wb') as f:
+                f.write(content)
+        os.replace(part, target)
+    except BaseException:
+        if os.path.isfile(part):
+            os.remove(part)
+        raise
+
+
+def stream_atomic(response, target, chunk_size=64 * 1024, resume=False, keep_partial=False):
+    # like write_atomic, but the body of a streamed response is written
+    # chunk by chunk, so memory stays bounded for large files.
+    # resume appends to an existing .part file (for 206 responses),
+    # keep_partial leaves the .part file behind if the transfer breaks off
+    part = target + '.part'
+    size = 0
+    try:
+        with open(part, 'ab' if resume else 'wb') as f:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                f.write(chunk)
+                size += len(chunk)
+        os.replace(part, target)
+    except BaseException:
+        if not keep_partial and os.path.isfile(part):
+            os.remove(part)
+        raise
+    return size
+
 
 def match_emails(emails_to_match, authors):
     matched = []
@@ -6,6 +6,7 @@ from classes.Constants import DEMO_SEARCH_RESULTS
 from classes.Parsers import get_parser
 from classes.Keys import ELSEVIER_API_KEY
 from classes.ElsevierScraper import ElsevierMetadataScraper
+from classes.Stores import ArticleCache
 from pprint import pprint
 import csv
 import pandas as pd
@@ -54,8 +55,10 @@ if __name__ == '__main__':
     ## Elsevier uses their own api
     if publisher == "elsevier":
         papers = []
+        # articles fetched in earlier runs are not requested again
+        article_cache = ArticleCache()
         for year in range(years[0], years[1] + 1):
-            scraper = ElsevierMetadataScraper(ELSEVIER_API_KEY, year, journalinfo["name"])
+            scraper = ElsevierMetadataScraper(ELSEVIER_API_KEY, year, journalinfo["name"], article_cache=article_cache)
             papers.append(pd.DataFrame(scraper.fetch_metadata()))
         papers = pd.concat(papers)
     else :   
@@ -112,7 +115,7 @@ if __name__ == '__main__':
             dfs.append(df)
 
         papers = pd.concat(dfs, ignore_index=True)
-        SearchProvider.driver.quit()
+        SearchProvider.close()
 
 
     
@@ -0,0 +1,66 @@
+import pytest
+
+from classes.ElsevierScraper import ElsevierMetadataScraper
+from classes.RateLimiters import HostRateLimiter, QuotaExhausted, RetriesExhausted
+
+
+class FakeResponse:
+    def __init__(self, status_code, data=None, headers=None):
+        self.status_code = status_code
+        self._data = data or {}
+        self.headers = headers or {}
+
+    def json(self):
+        return self._data
+
+
+class FakeSession:
+    # search pages of 25 entries; article lookups answer 429 after ok_articles
+    def __init__(self, ok_articles=None):
+        self.ok_articles = ok_articles
+        self.articles = 0
+
+    def get(self, url, headers=None, params=None, **kwargs):
+        if params is not None:
+            start = params['start']
+            entries = [{'prism:doi': f'10.1/{start + i}'} for i in range(25)] if start < 100 else []
+            return FakeResponse(200, {'search-results': {'entry': entries}})
+        self.articles += 1
+        if self.ok_articles is not None and self.articles > self.ok_articles:
+            return FakeResponse(429)
+        return FakeResponse(200, {'full-text-retrieval-response': {'coredata': {'dc:description': 'abstract'}}})
+
+
+def make_scraper(session):
+    scraper = ElsevierMetadataScraper('key', 2020, 'Journal', workers=1, max_retries=2,
+                                      rate_limiter=HostRateLimiter(initial_rate=1000, min_rate=1000, max_rate=1000))
+    scraper.session = session
+    return scraper
+
+
+def test_fetch_metadata_reads_all_pages(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    results = make_scraper(FakeSession()).fetch_metadata()
+    assert len(results) == 100
+    assert results[0]['abstract'] == 'abstract'
+
+
+def test_repeated_429_without_quota_headers_raises(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    session = FakeSession(ok_articles=30)
+    with pytest.raises(RetriesExhausted) as raised:
+        make_scraper(session).fetch_metadata()
+    # the first page was collected, the second one failed
+    assert isinstance(raised.value, QuotaExhausted)
+    assert raised.value.reset is None
+    assert raised.value.start == 25
+    assert len(raised.value.results) == 25
+
+
+def test_resume_from_exception(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with pytest.raises(QuotaExhausted) as raised:
+        make_scraper(FakeSession(ok_articles=30)).fetch_metadata()
+    rest = make_scraper(FakeSession()).fetch_metadata(start=raised.value.start)
+    dois = [row['doi'] for row in raised.value.results + rest]
+    assert dois == [f'10.1/{i}' for i in range(100)]
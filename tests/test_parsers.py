@@ -0,0 +1,66 @@
+import json
+
+import pytest
+
+# Parsers imports textract for the pdf parsers
+pytest.importorskip('textract')
+
+from classes.Parsers import ElsevierParser, OxfordParser
+
+ELSEVIER_JSON = {
+    'authors': {'content': [{'$$': [
+        {'#name': 'author', '$$': [{'#name': 'given-name', '_': 'Ann'}, {'#name': 'surname', '_': 'Lee'}]},
+    ]}]},
+}
+
+OXFORD_JSON = {
+    'url': 'https://dx.doi.org/10.1093/rfs/hhx001',
+    'name': 'A Paper',
+    'pageStart': '1',
+    'pageEnd': '20',
+    'datePublished': '2020-01-01',
+    'author': [{'name': 'Lee, Ann', 'affiliation': 'Some University'}],
+}
+
+
+def write_page(tmp_path, metas, script_type, data, **script_attrs):
+    tags = ''.join(f'<meta name="{name}" content="{content}">' for name, content in metas)
+    attrs = ''.join(f' {key}="{value}"' for key, value in script_attrs.items())
+    page = tmp_path / 'page.html'
+    page.write_text(f'<html><head>{tags}<script type="{script_type}"{attrs}>{json.dumps(data)}</script>'
+                    f'</head><body></body></html>', encoding='utf-8')
+    return str(page)
+
+
+@pytest.mark.parametrize('fast_parse', [False, True])
+def test_elsevier_fields_before_citation_volume(tmp_path, fast_parse):
+    # title and issue ahead of citation_volume came out as [] before the meta index
+    path = write_page(tmp_path, [('dc.identifier', '10.1016/j.jfineco.2020.01.001'),
+                                 ('citation_title', 'A Paper'), ('citation_issue', '2'),
+                                 ('citation_volume', '135'), ('citation_firstpage', '1'),
+                                 ('citation_lastpage', '20'), ('citation_publication_date', '2020/01/01')],
+                      'application/json', ELSEVIER_JSON, **{'data-iso-key': '_0'})
+    paper = ElsevierParser(path, fast_parse=fast_parse).parse().paper
+    assert paper['title'] == 'A Paper'
+    assert paper['issue'] == '2'
+    assert paper['volume'] == '135'
+    assert paper['year'] == '2020/01/01'
+    assert paper['author']['name'] == 'Ann Lee'
+
+
+@pytest.mark.parametrize('fast_parse', [False, True])
+def test_oxford_issue_and_date_before_citation_volume(tmp_path, fast_parse):
+    # this tag order raised a TypeError before the meta index
+    path = write_page(tmp_path, [('citation_issue', '3'), ('citation_publication_date', '2020/01/01'),
+                                 ('citation_volume', '33')],
+                      'application/ld+json', OXFORD_JSON)
+    paper = OxfordParser(path, fast_parse=fast_parse).parse().paper
+    assert paper['volume'] == '33'
+    assert paper['issue'] == '3'
+    assert paper['year'] == '2020/01/01'
+    assert paper['doi'] == '10.1093/rfs/hhx001'
+
+
+def test_oxford_without_citation_volume(tmp_path):
+    path = write_page(tmp_path, [('citation_issue', '3')], 'application/ld+json', OXFORD_JSON)
+    assert OxfordParser(path).parse().paper is None